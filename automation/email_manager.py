@@ -14,10 +14,10 @@ class EmailManager(object):
             self.pixel = pixel
             self.text = "Campaign Management,\n\n" + \
                         "There seems to be a problem locating the Jira ticket. Please find details below:\n\n" + \
-                        "Pixel: " + self.pixel[0] + "\n\n" + \
-                        "Campaign Name: " + self.pixel[1] + "\n\n" + \
-                        "Start Date: " + self.pixel[2] + "\n\n" + \
-                        "End Date: " + self.pixel[3] + "\n\n" + \
+                        "Pixel: " + self.pixel.pixel_id + "\n\n" + \
+                        "Campaign Name: " + self.pixel.campaign_name + "\n\n" + \
+                        "Start Date: " + self.pixel.start_date + "\n\n" + \
+                        "End Date: " + self.pixel.end_date + "\n\n" + \
                         "Thanks,\n" + \
                         "CI Team"
         else:
@@ -53,10 +53,10 @@ class EmailManager(object):
                 smtp.send_message(self.msg)
 
         except Exception as e:
-            self.logger.error = ("Email failed for pixel {} => {}".format(self.pixel[0], e))
+            self.logger.error("Email failed for pixel {} => {}".format(self.pixel.pixel_id, e))
 
         else:
-            self.logger.warning("An alert email for pixel {} has been sent.".format(self.pixel[0]))
+            self.logger.warning("An alert email for pixel {} has been sent.".format(self.pixel.pixel_id))
 
     # Create the email in a text format then send via smtp, finally save the email as a StringIO file and return
     #
@@ -77,7 +77,7 @@ class EmailManager(object):
                 smtp.send_message(self.msg)
 
         except Exception as e:
-            self.logger.error = ("Email failed for no pixels => {}".format(e))
+            self.logger.error("Email failed for no pixels => {}".format(e))
 
         else:
             self.logger.warning("An alert email for no pixels has been sent.")
@@ -2,19 +2,32 @@
 # Module holds the class => MaidHHIDMatch - manages Hive query template
 # Class responsible to populate the query with api sourced variables
 #
-from datetime import datetime
 
 
 class MaidHHIDMatch(object):
 
-    @staticmethod
-    def unified_impressions_query(pixel, start_date):
-        present_date = datetime.now().strftime('%Y%m%d')
-        query = """
+    # Hive session settings shared by the match query and its explain plan
+    #
+    query_settings = """
         set hive.execution.engine = tez;
         set fs.s3n.block.size=128000000;
         set fs.s3a.block.size=128000000;
+"""
+
+    @staticmethod
+    def unified_impressions_query(pixel, start_date):
+        return MaidHHIDMatch.query_settings + MaidHHIDMatch.match_select(pixel, start_date)
+
+    # Returns the explain plan version of the match query, used by the dry-run planner to estimate the scan size
+    # without running the query itself
+    #
+    @staticmethod
+    def explain_impressions_query(pixel, start_date):
+        return MaidHHIDMatch.query_settings + "\n        explain" + MaidHHIDMatch.match_select(pixel, start_date)
 
+    @staticmethod
+    def match_select(pixel, start_date):
+        query = """
         select 'hashed' as type,
         count(dlx_chpck) as dlx_chpck,
         count(b.hhid) as hhid
@@ -61,3 +74,28 @@ class MaidHHIDMatch(object):
         ) a
         """.format(start_date=start_date, pixel=pixel)
         return query
+
+    # Returns the lightweight activity query, a count of impressions per pixel since each pixel's start date, used to
+    # find the pixels with no impressions before the full match query is run
+    #
+    @staticmethod
+    def pixel_activity_query(pixels):
+        conditions = "\n        OR ".join("(PIXEL_ID = {pixel} AND DATA_DATE >= {start_date})"
+                                            .format(pixel=pixel, start_date=start_date)
+                                            for pixel, start_date in pixels)
+        query = """
+        set hive.execution.engine = tez;
+
+        select PIXEL_ID,
+        count(*) as impressions
+        from core_digital.unified_impression
+        WHERE PIXEL_ID IN ({pixels})
+        AND DATA_DATE >= ({min_start_date})
+        AND DATA_SOURCE_ID_PART = '6'
+        AND SOURCE = 'save'
+        AND ({conditions})
+        group by PIXEL_ID
+        """.format(pixels=", ".join(pixel for pixel, start_date in pixels),
+                   min_start_date=min(start_date for pixel, start_date in pixels),
+                   conditions=conditions)
+        return query
@@ -0,0 +1,182 @@
+# http_manager module
+# Module holds the classes => HttpManager - manages the shared, pooled http session configuration
+#                             RateLimitedAdapter - requests transport adapter with rate limiting and 429 backoff
+#                             CountingRetry - urllib3 connection retry policy that counts its retries
+#                             TokenBucket - per host request rate limiter
+# Classes responsible for all http transport settings used by the pixel-builder api call and the Jira client, these
+# include keep-alive connection pooling, per host connection limits, a default timeout, a token-bucket rate limit per
+# host and Retry-After aware backoff on throttled responses, with counters for retries and throttle waits
+#
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Takes a token, sleeping until one is available, returns the number of seconds waited
+    #
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class CountingRetry(Retry):
+    http_manager = None
+
+    # Carries the http manager over to the copy urllib3 makes of the policy for each retry
+    #
+    def new(self, **kwargs):
+        retry = super(CountingRetry, self).new(**kwargs)
+        retry.http_manager = self.http_manager
+        return retry
+
+    # Counts each retry urllib3 goes on to make, the increment raises instead once the retries are used up
+    #
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super(CountingRetry, self).increment(method, url, response, error, _pool, _stacktrace)
+        if self.http_manager is not None:
+            self.http_manager.count_connection_retry(getattr(_pool, 'host', url), error)
+        return retry
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, http_manager, **kwargs):
+        self.http_manager = http_manager
+        super(RateLimitedAdapter, self).__init__(**kwargs)
+
+    # Sends the request once a rate limit token is available, retries throttled responses after the Retry-After
+    # delay (or an exponential backoff when the header is missing)
+    #
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.http_manager.timeout
+        host = urlparse(request.url).netloc
+        attempt = 0
+        while True:
+            self.http_manager.throttle(host)
+            response = super(RateLimitedAdapter, self).send(request, **kwargs)
+            if response.status_code not in self.http_manager.retry_statuses or \
+                    attempt >= self.http_manager.max_retries:
+                return response
+
+            delay = self.http_manager.retry_delay(response, attempt)
+            self.http_manager.count_retry(host, response.status_code, delay)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+class HttpManager(object):
+    def __init__(self, timeout, pool_connections, pool_maxsize, rate_per_second, burst, max_retries, backoff_factor):
+        self.timeout = float(timeout)
+        self.pool_connections = int(pool_connections)
+        self.pool_maxsize = int(pool_maxsize)
+        self.rate_per_second = float(rate_per_second)
+        self.burst = int(burst)
+        self.max_retries = int(max_retries)
+        self.backoff_factor = float(backoff_factor)
+        self.max_backoff = 120.0
+        self.retry_statuses = (429, 503)
+        self.buckets = {}
+        self.counters = {'retries': 0, 'throttle_waits': 0, 'throttle_wait_seconds': 0.0}
+        self.http_session = None
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    # Returns the shared session, created on first use
+    #
+    def session(self):
+        with self.lock:
+            if self.http_session is None:
+                self.http_session = self.configure_session(requests.Session())
+        return self.http_session
+
+    # Mounts the pooled, rate limited adapters on a session, also used for sessions created by other clients
+    #
+    def configure_session(self, session):
+        # connection errors are retried by urllib3, throttled responses by the adapter itself, both are counted
+        retry = CountingRetry(total=self.max_retries, read=0, backoff_factor=self.backoff_factor,
+                              respect_retry_after_header=False, raise_on_status=False)
+        retry.http_manager = self
+        adapter = RateLimitedAdapter(self, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                                     pool_block=True, max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    # Waits for a rate limit token for the host, counting any wait as a throttle wait
+    #
+    def throttle(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate_per_second, self.burst)
+        waited = bucket.acquire()
+        if waited:
+            with self.lock:
+                self.counters['throttle_waits'] += 1
+                self.counters['throttle_wait_seconds'] += waited
+
+    # Returns the delay before retrying a throttled response, from its Retry-After header (seconds or http date)
+    # when present, otherwise from an exponential backoff
+    #
+    def retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        delay = None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+        if delay is None:
+            delay = self.backoff_factor * (2 ** attempt)
+        return min(max(delay, 0.0), self.max_backoff)
+
+    # Counts a retried response
+    #
+    def count_retry(self, host, status_code, delay):
+        with self.lock:
+            self.counters['retries'] += 1
+        self.logger.warning("Request to {} throttled with status {}, retrying in {:.1f} seconds"
+                            .format(host, status_code, delay))
+
+    # Counts a connection level retry made by urllib3
+    #
+    def count_connection_retry(self, host, error):
+        with self.lock:
+            self.counters['retries'] += 1
+        self.logger.warning("Request to {} failed, retrying => {}".format(host, error))
+
+    # Logs the retry and throttle wait counters for the run
+    #
+    def log_counters(self):
+        self.logger.info("Http layer: {} retries, {} rate limit waits totalling {:.1f} seconds"
+                         .format(self.counters['retries'], self.counters['throttle_waits'],
+                                 self.counters['throttle_wait_seconds']))
@@ -1,17 +1,21 @@
 # jira_manager module
 # Module holds the class => JiraManager - manages JIRA ticket interface
 # Class responsible for all JIRA related interactions including ticket searching, data pull, file attaching, comment
-# posting and field updating.
+# posting and field updating. The authenticated JIRA session is opened on first use, not on instance creation.
 #
-from jira import JIRA
 from datetime import datetime, timedelta
+import threading
 import logging
 
 
 class JiraManager(object):
-    def __init__(self, url, jira_token):
+    def __init__(self, url, jira_token, http_manager):
         self.tickets = []
-        self.jira = JIRA(url, basic_auth=jira_token)
+        self.http_manager = http_manager
+        self.url = url
+        self.jira_token = jira_token
+        self.jira_client = None
+        self.jira_lock = threading.Lock()
         self.date_range = ""
         self.file_name = ""
         self.advert_field_name = ""
@@ -21,6 +25,22 @@ class JiraManager(object):
         self.comment_alert = 'campaignmanagement'
         self.pixel_hhid_match_alert = 'The maid and cookie to hhid matches are now available.'
         self.match_fail_alert = 'The match query failed to return any results for this run.'
+        self.match_delta_alert = 'The maid and cookie to hhid matches have changed since the last posted results.'
+
+    # Opens the authenticated JIRA session on first use, shared by all the threads afterwards, the session uses the
+    # shared http layer for pooling, rate limiting and throttle retries in place of the client's own retries - the
+    # client is created without its server info request, so no request is sent before the http layer is mounted
+    #
+    @property
+    def jira(self):
+        if self.jira_client is None:
+            with self.jira_lock:
+                if self.jira_client is None:
+                    from jira import JIRA
+                    jira_client = JIRA(self.url, basic_auth=self.jira_token, max_retries=0, get_server_info=False)
+                    self.http_manager.configure_session(jira_client._session)
+                    self.jira_client = jira_client
+        return self.jira_client
 
     # Searches Jira for all tickets that match the parent ticket query criteria
     #
@@ -28,15 +48,15 @@ class JiraManager(object):
         # Query to find corresponding Jira Tickets from pixel id
         self.tickets = []
         jql_query = "project in (CAM) AND Type = " + jira_type + " AND Status in " + jira_status + " AND Pixels ~ " \
-                    + pixel[0]
+                    + pixel.pixel_id
         self.tickets = self.jira.search_issues(jql_query, maxResults=500)
         if len(self.tickets) > 0:
             self.logger.info("Pixel: {pixel}, Jira ticket -> {key}"
-                             .format(pixel=pixel[0], key=str(self.tickets[0].key)))
+                             .format(pixel=pixel.pixel_id, key=str(self.tickets[0].key)))
             return self.tickets[0]
         else:
             self.logger.error("Pixel: {pixel}, Jira ticket -> No Jira Ticket found"
-                              .format(pixel=pixel[0]))
+                              .format(pixel=pixel.pixel_id))
             return None
 
     # Searches Jira for parent tickets
@@ -63,17 +83,9 @@ class JiraManager(object):
 
     # Add a comment on tickets for match creation alert with counts and rate calculations
     #
-    def add_match_count_comment(self, ticket, result_dict, reporter, lead_analyst):
-        message = ""
-        cam_ticket = self.jira.issue(str(ticket[0]))
-        if reporter:
-            message += """[~{attention1}] """.format(attention1=str(reporter).replace(" ", "."))
-        if lead_analyst == 'Debra Eskra':
-            message += """[~{attention2}] """.format(attention2='deb.eskra')
-        if lead_analyst and lead_analyst != 'Debra Eskra':
-            message += """[~{attention2}] """.format(attention2=str(lead_analyst).replace(" ", "."))
-        if not reporter and not lead_analyst:
-            message += """[~{attention}] """.format(attention=self.comment_alert)
+    def add_match_count_comment(self, ticket, match_result, reporter, lead_analyst):
+        cam_ticket = self.jira.issue(str(ticket.key))
+        message = self.count_attention(reporter, lead_analyst)
 
         message += """{match_alert}
 
@@ -96,27 +108,85 @@ class JiraManager(object):
                      |Total Imprs/w IDs matched to a HH|Q = {total_hhid}|
 
                      """.format(match_alert=self.pixel_hhid_match_alert,
-                                hashes=result_dict.get('match_rate_hashes'),
-                                cookies=result_dict.get('match_rate_cookies'),
-                                full=result_dict.get('match_rate_full'),
-                                hashed_chpck='{0:,d}'.format(result_dict.get('hashed_chpck')),
-                                hashed_hhid='{0:,d}'.format(result_dict.get('hashed_hhid')),
-                                unhashed_chpck='{0:,d}'.format(result_dict.get('unhashed_chpck')),
-                                unhashed_hhid='{0:,d}'.format(result_dict.get('unhashed_hhid')),
-                                cookie_chpck='{0:,d}'.format(result_dict.get('cookie_chpck')),
-                                cookie_hhid='{0:,d}'.format(result_dict.get('cookie_hhid')),
-                                total_chpck='{0:,d}'.format(result_dict.get('total_chpck')),
-                                total_hhid='{0:,d}'.format(result_dict.get('total_hhid')),
-                                pixel_id=ticket[1][0],
-                                campaign_name=ticket[1][1]
+                                hashes=match_result.match_rate_hashes,
+                                cookies=match_result.match_rate_cookies,
+                                full=match_result.match_rate_full,
+                                hashed_chpck='{0:,d}'.format(match_result.hashed_chpck),
+                                hashed_hhid='{0:,d}'.format(match_result.hashed_hhid),
+                                unhashed_chpck='{0:,d}'.format(match_result.unhashed_chpck),
+                                unhashed_hhid='{0:,d}'.format(match_result.unhashed_hhid),
+                                cookie_chpck='{0:,d}'.format(match_result.cookie_chpck),
+                                cookie_hhid='{0:,d}'.format(match_result.cookie_hhid),
+                                total_chpck='{0:,d}'.format(match_result.total_chpck),
+                                total_hhid='{0:,d}'.format(match_result.total_hhid),
+                                pixel_id=ticket.pixel.pixel_id,
+                                campaign_name=ticket.pixel.campaign_name
                                 )
         self.jira.add_comment(issue=cam_ticket, body=message)
 
+    # Add a compact comment on tickets with the change in total counts and rates since the previous run
+    #
+    def add_match_delta_comment(self, ticket, match_result, delta, reporter, lead_analyst):
+        cam_ticket = self.jira.issue(str(ticket.key))
+        message = self.count_attention(reporter, lead_analyst)
+
+        message += """{match_alert}
+
+                     Pixel =>          *{pixel_id}*
+                     Campaign Name =>  *{campaign_name}*
+
+                     ||Match Basis||Rate||Change||
+                     |MAIDs|{hashes}|{hashes_change}|
+                     |Cookies|{cookies}|{cookies_change}|
+                     |Full|{full}|{full_change}|
+
+                     ||Matches||Count||Change||
+                     |Total Imprs with IDs captured|Q = {total_chpck}|{total_chpck_change}|
+                     |Total Imprs/w IDs matched to a HH|Q = {total_hhid}|{total_hhid_change}|
+
+                     """.format(match_alert=self.match_delta_alert,
+                                hashes=match_result.match_rate_hashes,
+                                hashes_change=self.change_format(delta['match_rate_hashes'][2], '{0:+.3f}'),
+                                cookies=match_result.match_rate_cookies,
+                                cookies_change=self.change_format(delta['match_rate_cookies'][2], '{0:+.3f}'),
+                                full=match_result.match_rate_full,
+                                full_change=self.change_format(delta['match_rate_full'][2], '{0:+.3f}'),
+                                total_chpck='{0:,d}'.format(match_result.total_chpck),
+                                total_chpck_change=self.change_format(delta['total_chpck'][2], '{0:+,d}'),
+                                total_hhid='{0:,d}'.format(match_result.total_hhid),
+                                total_hhid_change=self.change_format(delta['total_hhid'][2], '{0:+,d}'),
+                                pixel_id=ticket.pixel.pixel_id,
+                                campaign_name=ticket.pixel.campaign_name
+                                )
+        self.jira.add_comment(issue=cam_ticket, body=message)
+
+    # Formats a count or rate change, rates without a previous or current value are shown as 'None'
+    #
+    @staticmethod
+    def change_format(change, number_format):
+        if change == 'None':
+            return change
+        return number_format.format(change)
+
+    # Creates the attention mentions for the count comments
+    #
+    def count_attention(self, reporter, lead_analyst):
+        message = ""
+        if reporter:
+            message += """[~{attention1}] """.format(attention1=str(reporter).replace(" ", "."))
+        if lead_analyst == 'Debra Eskra':
+            message += """[~{attention2}] """.format(attention2='deb.eskra')
+        if lead_analyst and lead_analyst != 'Debra Eskra':
+            message += """[~{attention2}] """.format(attention2=str(lead_analyst).replace(" ", "."))
+        if not reporter and not lead_analyst:
+            message += """[~{attention}] """.format(attention=self.comment_alert)
+        return message
+
     # Add a comment to ticket informing of a match fail
     #
     def add_match_fail_comment(self, ticket, reporter, lead_analyst):
         message = ""
-        cam_ticket = self.jira.issue(str(ticket[0]))
+        cam_ticket = self.jira.issue(str(ticket.key))
         if reporter:
             message += """[~{attention1}] """.format(attention1=str(reporter).replace(" ", "."))
         if lead_analyst:
@@ -130,8 +200,8 @@ class JiraManager(object):
                      Campaign Name =>  *{campaign_name}*
                      
                      """.format(match_fail_comment=self.match_fail_alert,
-                                pixel_id=ticket[1][0],
-                                campaign_name=ticket[1][1]
+                                pixel_id=ticket.pixel.pixel_id,
+                                campaign_name=ticket.pixel.campaign_name
                                 )
         self.jira.add_comment(issue=cam_ticket, body=message)
 
@@ -145,4 +215,6 @@ class JiraManager(object):
     # Ends the current JIRA session
     #
     def kill_session(self):
-        self.jira.kill_session()
+        if self.jira_client is not None:
+            self.jira_client.kill_session()
+            self.jira_client = None
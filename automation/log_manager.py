@@ -0,0 +1,194 @@
+# log_manager module
+# Module holds the classes => LogManager - manages the asynchronous, structured run logging
+#                             ContextFilter - adds the thread's pixel_id, ticket and command_id fields to each record
+#                             JsonFormatter - formats each record as a single json line
+#                             BufferedFileHandler - file handler that flushes in batches rather than per record
+# Classes responsible for keeping log writes off the worker threads, records are put on an in-memory queue by the
+# threads and written to the zfs1 log file by a single listener thread, so a slow mount never stalls a Qubole or Jira
+# call
+#
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime
+import threading
+import queue
+import json
+import time
+import os
+import logging
+
+
+class ContextFilter(logging.Filter):
+    fields = ('pixel_id', 'ticket', 'command_id')
+
+    # Copies the calling thread's context onto the record, fields passed through 'extra' take precedence
+    #
+    def filter(self, record):
+        for field in self.fields:
+            if not hasattr(record, field):
+                setattr(record, field, getattr(LogManager.context, field, None))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    # Formats the record as a json line with the context fields
+    #
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).strftime('%m/%d/%Y %H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage().strip()
+        }
+        for field in ContextFilter.fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    def __init__(self, filename, buffer_records, flush_interval):
+        super(BufferedFileHandler, self).__init__(filename)
+        self.buffer_records = int(buffer_records)
+        self.flush_interval = float(flush_interval)
+        self.pending = 0
+        self.flushed = time.monotonic()
+
+    # Writes the record to the file buffer, flushing after a number of records, an interval, or any error record
+    #
+    def emit(self, record):
+        try:
+            # the blank spacer lines of the text log carry nothing in a json log
+            if not record.getMessage().strip():
+                return
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            if self.pending >= self.buffer_records or record.levelno >= logging.ERROR or \
+                    time.monotonic() - self.flushed >= self.flush_interval:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    # Flushes the buffered records to the file, holding the handler lock as the flush timer calls it from its own thread
+    #
+    def flush(self):
+        self.acquire()
+        try:
+            super(BufferedFileHandler, self).flush()
+            self.pending = 0
+            self.flushed = time.monotonic()
+        finally:
+            self.release()
+
+    # Switches the handler to a new log file, the buffered records are written to the old file first and the new file
+    # is opened with the next record
+    #
+    def roll_over(self, filename):
+        self.acquire()
+        try:
+            self.flush()
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(filename)
+        finally:
+            self.release()
+
+    # Flushes any records still buffered, so records logged just before an idle period reach the file
+    #
+    def flush_pending(self):
+        self.acquire()
+        try:
+            if self.pending:
+                self.flush()
+        finally:
+            self.release()
+
+
+class LogManager(object):
+    context = threading.local()
+
+    def __init__(self, logfile_name, buffer_records, flush_interval):
+        self.logfile_name = logfile_name
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        self.log_queue = queue.Queue(-1)
+        self.queue_handler = None
+        self.file_handler = None
+        self.listener = None
+        self.flush_timer = None
+        self.flush_stop = threading.Event()
+
+    # Routes the root logger through the queue and starts the single writer thread and the flush timer
+    #
+    def start(self):
+        self.file_handler = BufferedFileHandler(self.logfile_name, self.buffer_records, self.flush_interval)
+        self.file_handler.setFormatter(JsonFormatter())
+
+        self.queue_handler = QueueHandler(self.log_queue)
+        self.queue_handler.addFilter(ContextFilter())
+
+        root_logger = logging.getLogger('')
+        root_logger.addHandler(self.queue_handler)
+        root_logger.setLevel(logging.INFO)
+
+        self.listener = QueueListener(self.log_queue, self.file_handler, respect_handler_level=True)
+        self.listener.start()
+
+        self.flush_stop.clear()
+        self.flush_timer = threading.Thread(target=self.flush_manager, name='LogFlush', daemon=True)
+        self.flush_timer.start()
+
+    # Flushes the buffered records every flush interval, the file handler otherwise only checks the interval when the
+    # next record arrives
+    #
+    def flush_manager(self):
+        while not self.flush_stop.wait(float(self.flush_interval)):
+            self.file_handler.flush_pending()
+
+    # Writes out any queued records, stops the writer thread and the flush timer and closes the log file
+    #
+    def stop(self):
+        if self.queue_handler is not None:
+            logging.getLogger('').removeHandler(self.queue_handler)
+            self.queue_handler = None
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self.flush_timer is not None:
+            self.flush_stop.set()
+            self.flush_timer.join()
+            self.flush_timer = None
+        if self.file_handler is not None:
+            self.file_handler.close()
+            self.file_handler = None
+
+    # Continues the log in a new file, used by the long running daemon so its finished log files can be compressed and
+    # removed by the retention manager
+    #
+    def roll_over(self, logfile_name):
+        self.logfile_name = logfile_name
+        if self.file_handler is not None:
+            # the records already queued go to the old file
+            self.log_queue.join()
+            self.file_handler.roll_over(logfile_name)
+
+    # Sets context fields for all records logged by the calling thread
+    #
+    @staticmethod
+    def set_context(**fields):
+        for field, value in fields.items():
+            setattr(LogManager.context, field, value)
+
+    # Clears the calling thread's context fields, the pool threads are reused across pixels
+    #
+    @staticmethod
+    def clear_context():
+        for field in ContextFilter.fields:
+            setattr(LogManager.context, field, None)
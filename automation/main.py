@@ -26,6 +26,13 @@
 #                       qubole_manager.py,
 #                       email_manager.py,
 #                       hhid_pixel_query.py,
+#                       http_manager.py,
+#                       log_manager.py,
+#                       work_queue_manager.py,
+#                       scheduler_manager.py,
+#                       pixel_records.py,
+#                       retention_manager.py,
+#                       query_plan_manager.py,
 #                       config.ini
 # Deployed Location:    //prd-use1a-pr-34-ci-operations-01/opt/app/automations/brad/Projects/
 #                                                                           campaign_management_mobile_device_id_match/
@@ -43,18 +50,28 @@
 
 # main module
 # Responsible for reading in the basic configurations settings, creating the log file, and creating and launching
-# the Campaign Management SSID Manager (CM-SSID), finally it launches the purge_files method to remove log files that
-# are older than a prescribed retention period. A console logger option is offered via keyboard input for development
+# the Campaign Management SSID Manager (CM-SSID), alongside it the retention manager compresses, archives and removes
+# old log and results files in the background. A console logger option is offered via keyboard input for development
 # purposes when the main.py script is invoked. For production, import main as a module and launch the main function
-# as main.main(), which uses 'n' as the default input to the the console logger run option.
+# as main.main(), which uses 'n' as the default input to the the console logger run option. A dry-run option
+# (--dry-run) builds and plans every query, reporting the expected scan size, without running them or posting to Jira.
+# With the work queue enabled the run only enqueues its pixel tickets, and any number of worker processes (--worker),
+# on any host with the shared zfs1 mount, claim the tickets and run the queries, results and comments. A daemon option
+# (--daemon) keeps the clients warm and refreshes each live pixel on its own interval instead of all at once.
 #
 from datetime import datetime, timedelta
+import argparse
+import atexit
+import socket
 import os
 import configparser
 import logging
 
 #from VaultClient3 import VaultClient3 as VaultClient
 from mobile_id_match_manager import MobileIDMatchManager
+from log_manager import LogManager
+from scheduler_manager import SchedulerManager
+from retention_manager import RetentionManager
 
 
 # Define a console logger for development purposes
@@ -70,7 +87,7 @@ def console_logger():
     logging.getLogger('').addHandler(console)
 
 
-def main(con_opt='n'):
+def main(con_opt='n', dry_run=False, worker=False, daemon=False):
     today_date = (datetime.now() - timedelta(hours=6)).strftime('%Y%m%d-%H%M%S')
 
     # create a configparser object and open in read mode
@@ -85,26 +102,55 @@ def main(con_opt='n'):
         "jql_status":           config.get('Jira', 'status'),
         "qubole_token":         config.get('Qubole', 'bradruck-prod-operations-consumer'),
         "cluster_label":        config.get('Qubole', 'cluster-label'),
+        "activity_prefilter":   config.getboolean('Qubole', 'activity_prefilter'),
+        "explain_queries":      config.getboolean('Qubole', 'explain_queries'),
+        "partition_bytes":      config.get('Qubole', 'partition_bytes_estimate'),
+        "max_batch_bytes":      config.get('Qubole', 'max_batch_scan_bytes'),
+        "query_pool_size":      config.get('Qubole', 'query_pool_size'),
         "api_url":              config.get('Api', 'api_url', raw=True),
         "results_json_path":    config.get('ResultsFile', 'path'),
         "results_json_name":    config.get('Project Details', 'app_name'),
         "email_subject":        config.get('Email', 'subject'),
         "email_to":             config.get('Email', 'to'),
         "email_from":           config.get('Email', 'from'),
-        "email_cc":             config.get('Email', 'cc')
+        "email_cc":             config.get('Email', 'cc'),
+        "http_timeout":         config.get('Http', 'timeout'),
+        "http_pool_connections": config.get('Http', 'pool_connections'),
+        "http_pool_maxsize":    config.get('Http', 'pool_maxsize'),
+        "http_rate":            config.get('Http', 'rate_per_second'),
+        "http_burst":           config.get('Http', 'burst'),
+        "http_retries":         config.get('Http', 'max_retries'),
+        "http_backoff":         config.get('Http', 'backoff_factor'),
+        "comment_mode":         config.get('Comments', 'mode'),
+        "count_threshold":      config.get('Comments', 'count_threshold'),
+        "rate_threshold":       config.get('Comments', 'rate_threshold'),
+        "work_queue_enabled":   config.getboolean('WorkQueue', 'enabled'),
+        "work_queue_path":      config.get('WorkQueue', 'path'),
+        "work_queue_lease":     config.get('WorkQueue', 'lease_seconds'),
+        "work_queue_attempts":  config.get('WorkQueue', 'max_attempts'),
+        "worker_poll_interval": config.get('WorkQueue', 'poll_interval'),
+        "worker_idle_exit":     config.get('WorkQueue', 'idle_exit')
     }
 
     # logfile path to point to the Operations_limited drive on zfs
-    purge_days = config.get('LogFile', 'retention_days')
     log_file_path = config.get('LogFile', 'path')
     logfile_name = '{}{}_{}.log'.format(log_file_path, config.get('Project Details', 'app_name'), today_date)
+    if worker:
+        # workers on several hosts run alongside the enqueuing run, each writes its own log file
+        logfile_name = '{}{}_worker_{}_{}.log'.format(log_file_path, config.get('Project Details', 'app_name'),
+                                                       socket.gethostname(), today_date)
+        config_params['work_queue_enabled'] = True
+    elif daemon:
+        # the daemon's log is rolled over to a new file on each retention interval
+        logfile_name = '{}{}_daemon_{}.log'.format(log_file_path, config.get('Project Details', 'app_name'),
+                                                   today_date)
 
     # check to see if log file already exits for the day to avoid duplicate execution
     if not os.path.isfile(logfile_name):
-        logging.basicConfig(filename=logfile_name,
-                            level=logging.INFO,
-                            format='%(asctime)s: %(levelname)-7s: %(name)-30s: %(threadName)-12s: %(message)s',
-                            datefmt='%m/%d/%Y %H:%M:%S')
+        # json structured logging, records are written to the log file by a single background thread
+        log_manager = LogManager(logfile_name, config.get('LogFile', 'buffer_records'),
+                                 config.get('LogFile', 'flush_interval'))
+        log_manager.start()
 
         logger = logging.getLogger(__name__)
 
@@ -112,18 +158,67 @@ def main(con_opt='n'):
         if con_opt and con_opt in ['y', 'Y']:
             console_logger()
 
-        logger.info("Process Start - Weekly HHID Check, Campaign Management - {}\n".format(today_date))
-
-        # create CM-SSID object and launch the process manager
-        cm_ssid_match = MobileIDMatchManager(config_params)
-        cm_ssid_match.process_manager()
-
-        # search logfile directory for old log files to purge
-        #cm_ssid_match.purge_files(purge_days, log_file_path)
+        # compress, archive and remove old log and results files in the background while the run goes ahead,
+        # skipped for dry-runs and workers, the main run looks after the files, a daemon re-runs it on an interval
+        retention = None
+        if not dry_run and not worker:
+            retention = RetentionManager(config.get('Project Details', 'app_name'), log_file_path,
+                                         config.get('LogFile', 'compress_days'),
+                                         config.get('LogFile', 'retention_days'), config_params['results_json_path'],
+                                         config.get('ResultsFile', 'compress_days'),
+                                         config.get('ResultsFile', 'archive_days'),
+                                         config.get('ResultsFile', 'retention_days'), [logfile_name])
+            retention.start()
+
+        try:
+            logger.info("Process Start - Weekly HHID Check, Campaign Management - {}\n".format(today_date))
+
+            # create CM-SSID object and launch the process manager, or only the query planner for a dry-run
+            cm_ssid_match = MobileIDMatchManager(config_params)
+            if dry_run:
+                logger.info("Dry-run requested, planning queries only\n")
+                cm_ssid_match.plan_manager()
+            elif worker:
+                cm_ssid_match.worker_manager()
+            elif daemon:
+                scheduler = SchedulerManager(cm_ssid_match, config.get('Daemon', 'poll_interval'),
+                                             config.get('Daemon', 'refresh_interval'),
+                                             config.get('Daemon', 'retry_interval'),
+                                             config.get('Daemon', 'max_refresh_per_cycle'),
+                                             config.get('Daemon', 'state_file'), retention,
+                                             config.get('Daemon', 'retention_interval'), log_manager,
+                                             '{}{}_daemon_'.format(log_file_path,
+                                                                   config.get('Project Details', 'app_name')))
+                scheduler.scheduler_manager()
+            else:
+                cm_ssid_match.process_manager()
+
+        finally:
+            # a fast run doesn't wait on a long retention pass, the non-daemon retention thread finishes it before the
+            # interpreter exits and the log records are written out after it
+            if retention is not None and not retention.join(1):
+                logger.info("Retention pass still running, it finishes before exit")
+                atexit.register(log_manager.stop)
+            else:
+                # write out any queued and buffered log records before exiting
+                log_manager.stop()
 
 
 if __name__ == '__main__':
-    # prompt user for use of console logging -> for use in development not production
-    ans = input("\nWould you like to enable a console logger for this run?\n Please enter y or n:\t")
-    print()
-    main(ans)
+    parser = argparse.ArgumentParser(description='Campaign Management - Mobile Device ID Match')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='plan the queries and estimate scan size without running them or posting to Jira')
+    parser.add_argument('--worker', action='store_true',
+                        help='claim and run pixel work items from the shared work queue')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running, polling for new pixels and refreshing each on its own interval')
+    args = parser.parse_args()
+
+    # prompt user for use of console logging -> for use in development not production, workers and the daemon run
+    # unattended without a terminal so they are never prompted
+    if args.worker or args.daemon:
+        ans = 'n'
+    else:
+        ans = input("\nWould you like to enable a console logger for this run?\n Please enter y or n:\t")
+        print()
+    main(ans, args.dry_run, args.worker, args.daemon)
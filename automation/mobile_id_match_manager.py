@@ -6,15 +6,21 @@ from datetime import datetime, timedelta
 import time
 import os
 import json
+import socket
+import threading
 from multiprocessing.dummy import Pool as ThreadPool
-from multiprocessing_logging import install_mp_handler
 import logging
 
+from http_manager import HttpManager
+from log_manager import LogManager
 from jira_manager import JiraManager
 from qubole_manager import QuboleManager
 from hhid_pixel_query import MaidHHIDMatch
 from pixel_name_search import MobileSSIDSearchManager
 from email_manager import EmailManager
+from work_queue_manager import WorkQueueManager
+from query_plan_manager import QueryPlanManager
+from pixel_records import WorkItem, MatchResult
 
 today_date = (datetime.now() - timedelta(hours=6)).strftime('%Y%m%d-%H%M%S')
 
@@ -23,11 +29,21 @@ class MobileIDMatchManager(object):
     def __init__(self, config_params):
         self.jira_url = config_params['jira_url']
         self.jira_token = config_params['jira_token']
-        self.jira_pars = JiraManager(self.jira_url, self.jira_token)
+        self.http_manager = HttpManager(config_params['http_timeout'], config_params['http_pool_connections'],
+                                        config_params['http_pool_maxsize'], config_params['http_rate'],
+                                        config_params['http_burst'], config_params['http_retries'],
+                                        config_params['http_backoff'])
+        self.jira_pars = JiraManager(self.jira_url, self.jira_token, self.http_manager)
         self.jql_type = config_params['jql_type']
         self.jql_status = config_params['jql_status']
         self.qubole_token = config_params['qubole_token']
         self.cluster_label = config_params['cluster_label']
+        self.activity_prefilter = config_params['activity_prefilter']
+        self.inactive_pixels = set()
+        self.explain_queries = config_params['explain_queries']
+        self.partition_bytes = config_params['partition_bytes']
+        self.max_batch_bytes = config_params['max_batch_bytes']
+        self.query_pool_size = int(config_params['query_pool_size'])
         self.api_url = config_params['api_url']
         self.results_json_path = config_params['results_json_path']
         self.results_json_name = config_params['results_json_name']
@@ -35,8 +51,30 @@ class MobileIDMatchManager(object):
         self.email_to = config_params['email_to']
         self.email_from = config_params['email_from']
         self.email_cc = config_params['email_cc']
+        self.comment_mode = config_params['comment_mode']
+        self.count_threshold = float(config_params['count_threshold'])
+        self.rate_threshold = float(config_params['rate_threshold'])
+        self.count_keys = ['hashed_chpck', 'hashed_hhid', 'unhashed_chpck', 'unhashed_hhid', 'cookie_chpck',
+                           'cookie_hhid', 'total_chpck', 'total_hhid']
+        self.rate_keys = ['match_rate_hashes', 'match_rate_cookies', 'match_rate_full']
+        self.previous_results = {}
+        self.worker_poll_interval = int(config_params['worker_poll_interval'])
+        self.worker_idle_exit = int(config_params['worker_idle_exit'])
+        # in work queue mode the run only enqueues its tickets, 'main.py --worker' processes claim and run them
+        if config_params['work_queue_enabled']:
+            self.work_queue = WorkQueueManager(config_params['work_queue_path'], config_params['work_queue_lease'],
+                                               config_params['work_queue_attempts'])
+        else:
+            self.work_queue = None
+        self.run_id = today_date
         self.results_file_name = '{}{}_{}.json'.format(self.results_json_path, self.results_json_name, today_date)
         self.results_dict = {}
+        # the cumulative per pixel snapshot of the newest results and the results last posted to Jira
+        self.latest_file_name = '{}{}_latest.json'.format(self.results_json_path, self.results_json_name)
+        self.latest_dict = {}
+        # the pixels whose comments, fail comments or missing ticket alerts went out (or were skipped as unchanged),
+        # a scheduler only marks these as refreshed and retries the rest sooner
+        self.completed_pixels = set()
         self.issues = []
         self.tickets = []
         self.logger = logging.getLogger(__name__)
@@ -45,43 +83,101 @@ class MobileIDMatchManager(object):
     #
     def process_manager(self):
         try:
-            # creates a list of lists for each found pixel id, includes campaign - name, start and end dates
+            # creates a list of pixel records for each found pixel id, includes campaign - name, start and end dates
             pixel_list = self.api_manager()
         except Exception as e:
             self.logger.error("Pixel-builder api call and dictionary search failed => {}".format(e))
         else:
-            # check for an empty pixel list, if not, process the list
-            if len(pixel_list) != 0:
-                self.logger.info("\n")
-                self.logger.info("\n\nThese are the pixel ids with their corresponding Jira-tickets-ids (if found):\n")
-
-                #  create the iterable required for the concurrency processing, jira ticket search is done here
-                self.iterable_creator(pixel_list)
-
-                # launch the qubole queries concurrently, includes results handling and dictionary addition as well as
-                # jira ticket comment posting, first check for matching jira tickets, if none then bypass concurrency
-                if [x for x in self.tickets if x[0] is not None]:
-                    self.pixel_concurrency_manager(self.tickets)
-                else:
-                    self.logger.info("\n")
-                    self.logger.warning("There were no matching Jira tickets for the pixels found.\n")
-
-                # finally, if any, write the results of the entire run dictionary to zfs located json file
-                if self.results_dict:
-                    self.json_file_write()
-                else:
-                    self.logger.warning("Since there were no results from the run, no json file was created.\n")
+            # check for a failed api call, then for an empty pixel list, if not, process the list
+            if pixel_list is None:
+                self.logger.error("\n\nThe pixel-builder api call failed to return a pixel dictionary.\n")
+            elif len(pixel_list) != 0:
+                self.pixel_run_manager(pixel_list)
             else:
                 # if no pixels found, send email to campaign management to notify
                 self.emailer(None)
                 # writes log error and exits program
                 self.logger.error("\n\nThere were no pixel ids returned from the api call.\n")
 
+    # Runs the ticket search, queries, results and comments for a list of pixels, results are saved to a new json file
+    # for each call, so a long running scheduler can call it repeatedly with the same warm clients
+    #
+    def pixel_run_manager(self, pixel_list):
+        self.run_id = (datetime.now() - timedelta(hours=6)).strftime('%Y%m%d-%H%M%S')
+        self.results_file_name = '{}{}_{}.json'.format(self.results_json_path, self.results_json_name, self.run_id)
+        self.results_dict = {}
+        self.latest_dict = {}
+        self.completed_pixels = set()
+        self.tickets = []
+        # load the results last posted to Jira so unchanged pixels can skip or shorten their comment posts
+        if self.comment_mode == 'delta':
+            self.previous_results = self.latest_results_load()
+
+        self.logger.info("\n")
+        self.logger.info("\n\nThese are the pixel ids with their corresponding Jira-tickets-ids (if found):\n")
+
+        #  create the iterable required for the concurrency processing, jira ticket search is done here
+        self.iterable_creator(pixel_list)
+
+        # launch the qubole queries concurrently, includes results handling and dictionary addition as well as
+        # jira ticket comment posting, first check for matching jira tickets, if none then bypass concurrency
+        if not [x for x in self.tickets if x.key is not None]:
+            self.logger.info("\n")
+            self.logger.warning("There were no matching Jira tickets for the pixels found.\n")
+        elif self.work_queue is not None:
+            # post the no-activity comments here and hand the active tickets to the workers, the last worker to
+            # finish writes the run's json file
+            active_tickets = self.activity_filter(self.tickets)
+            inactive_tickets = [x for x in self.tickets if x.pixel.pixel_id in self.inactive_pixels]
+            if inactive_tickets:
+                self.pixel_concurrency_manager(inactive_tickets)
+            if active_tickets:
+                self.work_queue.enqueue(self.run_id, self.results_file_name, active_tickets)
+                self.completed_pixels.update(x.pixel.pixel_id for x in active_tickets)
+        else:
+            self.activity_filter(self.tickets)
+            self.pixel_concurrency_manager(self.tickets)
+
+        # finally, if any, write the results of the entire run dictionary to zfs located json file
+        if self.work_queue is None:
+            if self.results_dict:
+                self.json_file_write()
+            else:
+                self.logger.warning("Since there were no results from the run, no json file was created.\n")
+
+        # log the http retry and throttle counters for the pixel-builder and jira calls
+        self.http_manager.log_counters()
+
+    # Manages a dry-run, builds the query plan for the pixels with a matching Jira ticket - nothing is posted to Jira,
+    # and the activity prefilter query is not run, so pixels without impressions are still included in the plan
+    #
+    def plan_manager(self):
+        try:
+            # creates a list of pixel records for each found pixel id, includes campaign - name, start and end dates
+            pixel_list = self.api_manager()
+        except Exception as e:
+            self.logger.error("Pixel-builder api call and dictionary search failed => {}".format(e))
+        else:
+            if pixel_list:
+                # the ticket search only, no alert emails are sent for the pixels without a ticket
+                tickets = []
+                for pixel in pixel_list:
+                    issue = self.jira_pars.find_tickets(self.jql_type, self.jql_status, pixel)
+                    if issue is not None:
+                        tickets.append(WorkItem(issue.key, pixel))
+
+                query_plan = QueryPlanManager([x.pixel for x in tickets], self.qubole_token, self.cluster_label,
+                                              self.explain_queries, self.partition_bytes, self.max_batch_bytes,
+                                              self.query_pool_size)
+                query_plan.plan_manager(len(pixel_list), self.activity_prefilter)
+            else:
+                self.logger.error("\n\nThere were no pixel ids returned from the api call, no plan to create.\n")
+
     # Manages the api class, instance creation and function calls
     #
     def api_manager(self):
         # create api search object
-        api_manager = MobileSSIDSearchManager()
+        api_manager = MobileSSIDSearchManager(self.http_manager)
         pixel_dict = api_manager.api_call(self.api_url)
 
         # confirm api call returned results, search to reduce pixel list to active campaigns then log results
@@ -92,7 +188,7 @@ class MobileIDMatchManager(object):
         else:
             return None
 
-    # Creates an iterable list of lists with pixel information and jira ticket number for the concurrency requirement
+    # Creates an iterable list of work items, pixel record and jira ticket key, for the concurrency requirement
     #
     def iterable_creator(self, pixel_list):
         #  iterate through the found pixel list
@@ -101,25 +197,58 @@ class MobileIDMatchManager(object):
             self.issues = self.jira_pars.find_tickets(self.jql_type, self.jql_status, pixel)
             # add jira ticket key to complete the concurrency manager iterable
             if self.issues is not None:
-                self.tickets.append([self.issues.key, pixel])
+                self.tickets.append(WorkItem(self.issues.key, pixel))
             else:
                 # if no jira ticket found, send email to campaign management to alert a potential problem
                 self.emailer(pixel)
+                self.completed_pixels.add(pixel.pixel_id)
+
+    # Runs one lightweight impression count query for all the ticketed pixels, the pixels without impressions since
+    # their start date are flagged to bypass the full match query, returns the tickets of the active pixels - if the
+    # activity query fails all the pixels are treated as active
+    #
+    def activity_filter(self, tickets):
+        self.inactive_pixels = set()
+        if not self.activity_prefilter:
+            return tickets
 
-    # Run the qubole query for each of the pixel numbers, up to 10 active threads at a time
+        # set the logging level of Qubole to "WARNING" to filter out 'info level' logging message deluge
+        logging.getLogger("qds_connection").setLevel(logging.WARNING)
+
+        qubole = QuboleManager(("activity", "{} pixels".format(len(tickets))), self.qubole_token, self.cluster_label,
+                               MaidHHIDMatch.pixel_activity_query([(x.pixel.pixel_id, x.pixel.start_date)
+                                                                  for x in tickets]))
+        try:
+            rows = qubole.get_rows()
+        finally:
+            # the query's command id stays off the records logged by this thread afterwards
+            LogManager.clear_context()
+        if rows is None:
+            self.logger.warning("The pixel activity query failed, running the match query for all pixels")
+            return tickets
+
+        active_pixels = set(row[0].strip() for row in rows if len(row) == 2 and row[1].strip().isdigit() and
+                            int(row[1]) > 0)
+        active_tickets = [x for x in tickets if x.pixel.pixel_id in active_pixels]
+        self.inactive_pixels = set(x.pixel.pixel_id for x in tickets if x.pixel.pixel_id not in active_pixels)
+        self.logger.info("The pixel activity query found {} of {} pixels with impressions, {} go straight to the "
+                         "fail comment".format(len(active_tickets), len(tickets), len(self.inactive_pixels)))
+        return active_tickets
+
+    # Run the qubole query for each of the pixel numbers, up to query_pool_size active threads at a time, or one thread
+    # per pixel when it is 0
     #
     def pixel_concurrency_manager(self, tickets):
         self.logger.info("\n")
         self.logger.info("Beginning the maid to hhid match concurrent processing")
         self.logger.info("\n")
 
-        # activate concurrency logging handler
-        install_mp_handler(logger=self.logger)
         # set the logging level of urllib3 to "ERROR" to filter out 'warning level' logging message deluge
         logging.getLogger("urllib3").setLevel(logging.ERROR)
 
-        # launches a thread for each of the tickets
-        pixel_pool = ThreadPool(processes=len(tickets))
+        # launches a thread for each of the tickets, up to the pool size
+        pool_size = min(self.query_pool_size, len(tickets)) if self.query_pool_size else len(tickets)
+        pixel_pool = ThreadPool(processes=pool_size)
         try:
             pixel_pool.map(self.query_manager, tickets)
             pixel_pool.close()
@@ -130,101 +259,244 @@ class MobileIDMatchManager(object):
             self.logger.info("\n")
             self.logger.info("Concluded the maid to hhid match concurrent processing\n")
 
+    # Manages a worker process, claims work items from the shared queue and runs the query, results and comment steps
+    # for each, writing the results back to the queue, finished runs are collected after each item and whenever the
+    # queue is empty, exits after the queue has been empty for the idle period
+    #
+    def worker_manager(self):
+        worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())
+        run_id = None
+        idle_since = time.time()
+        self.logger.info("Worker {} started on work queue {}".format(worker_id, self.work_queue.db_path))
+
+        while True:
+            item = self.work_queue.claim(worker_id)
+            if item is None:
+                self.run_finalizer()
+                if self.worker_idle_exit and time.time() - idle_since >= self.worker_idle_exit:
+                    self.logger.info("Work queue empty for {} seconds, worker {} exiting"
+                                     .format(self.worker_idle_exit, worker_id))
+                    break
+                time.sleep(self.worker_poll_interval)
+                continue
+
+            item_id, item_run_id, results_file_name, ticket = item
+            # load the results last posted to Jira for comparison once per run
+            if item_run_id != run_id:
+                run_id = self.run_id = item_run_id
+                self.results_file_name = results_file_name
+                if self.comment_mode == 'delta':
+                    self.previous_results = self.latest_results_load()
+
+            self.work_item_manager(worker_id, item_id, ticket)
+            self.run_finalizer()
+            idle_since = time.time()
+
+        self.http_manager.log_counters()
+
+    # Writes the json files of every finished run, the run's results are collected by only one of the workers
+    #
+    def run_finalizer(self):
+        for run_id, results_file_name in self.work_queue.finished_runs():
+            run_results = self.work_queue.finalize_run(run_id)
+            if run_results:
+                self.results_file_name = results_file_name
+                self.latest_dict = run_results
+                self.results_dict = {k: v['results'] for (k, v) in run_results.items()}
+                self.json_file_write()
+                self.latest_dict = {}
+                self.results_dict = {}
+            elif run_results is not None:
+                self.logger.warning("Since there were no results from run {}, no json file was created.\n"
+                                    .format(run_id))
+
+    # Runs a single claimed work item, renewing its lease in the background until the item is finished
+    #
+    def work_item_manager(self, worker_id, item_id, ticket):
+        finished = threading.Event()
+
+        def lease_renewer():
+            while not finished.wait(self.work_queue.lease_seconds / 3.0):
+                if not self.work_queue.renew(item_id, worker_id):
+                    self.logger.warning("Lost the lease on work item {}".format(item_id))
+                    break
+
+        renewer = threading.Thread(target=lease_renewer, name='LeaseRenewer', daemon=True)
+        renewer.start()
+        try:
+            self.query_manager(ticket)
+        except Exception as e:
+            self.logger.error("Work item {} for pixel {} failed => {}".format(item_id, ticket.pixel.pixel_id, e))
+            self.work_queue.release(item_id, worker_id)
+        else:
+            self.results_dict.pop(ticket.pixel.pixel_id, None)
+            self.work_queue.complete(item_id, worker_id, self.latest_dict.pop(ticket.pixel.pixel_id, None))
+        finally:
+            finished.set()
+            renewer.join()
+
     # Runs a twice a week match and returns results
     #
     def query_manager(self, ticket):
         # checks that the required ticket information exists, else bypasses Qubole
         if ticket:
-            # set the logging level of Qubole to "WARNING" to filter out 'info level' logging message deluge
-            logging.getLogger("qds_connection").setLevel(logging.WARNING)
-
-            query = MaidHHIDMatch()
-            qubole = QuboleManager((ticket[0], "".join(str(ticket[1][0]))), self.qubole_token,
-                                   self.cluster_label, query.unified_impressions_query(ticket[1][0],
-                                   ticket[1][2]))
-            query_result = qubole.get_results()
-
-            self.results_manager(ticket, query_result)
-
-    # Copies the results to a dictionary and then adds this to a run level dictionary for json file creation
+            # tag this thread's log records with the pixel and ticket until the thread moves to its next ticket, the
+            # context is cleared even when a step raises, the pool threads are reused
+            LogManager.set_context(pixel_id=ticket.pixel.pixel_id, ticket=ticket.key)
+            try:
+                # pixels without impressions skip the match query and go straight to the fail comments
+                if ticket.pixel.pixel_id in self.inactive_pixels:
+                    self.inactive_manager(ticket)
+                    return
+
+                # set the logging level of Qubole to "WARNING" to filter out 'info level' logging message deluge
+                logging.getLogger("qds_connection").setLevel(logging.WARNING)
+
+                query = MaidHHIDMatch()
+                qubole = QuboleManager((ticket.key, "".join(str(ticket.pixel.pixel_id))), self.qubole_token,
+                                       self.cluster_label, query.unified_impressions_query(ticket.pixel.pixel_id,
+                                       ticket.pixel.start_date))
+                query_result = qubole.get_results()
+
+                self.results_manager(ticket, query_result)
+            finally:
+                LogManager.clear_context()
+
+    # Creates the match result from the query counts and then adds this to a run level dictionary for json file creation
     #
     def results_manager(self, ticket, query_result):
-        # filter out the results where there are no counts available, sets the result_dict to 'None' -
+        # filter out the results where there are no counts available, sets the match_result to 'None' -
         # there is no dictionary of results saved for all-zero count searches and no results posted to ticket
-        result_dict = {}
-        self.logger.info("The pixel_id is {} and the campaign name is {}".format(ticket[1][0], ticket[1][1]))
+        pixel = ticket.pixel
+        self.logger.info("The pixel_id is {} and the campaign name is {}".format(pixel.pixel_id, pixel.campaign_name))
         try:
-            # add query results to dictionary
-            result_dict['hashed_chpck'] = query_result[0]
-            result_dict['hashed_hhid'] = query_result[1]
-            result_dict['unhashed_chpck'] = query_result[2]
-            result_dict['unhashed_hhid'] = query_result[3]
-            result_dict['cookie_chpck'] = query_result[4]
-            result_dict['cookie_hhid'] = query_result[5]
-            result_dict['total_chpck'] = (query_result[0] + query_result[2] + query_result[4])
-            result_dict['total_hhid'] = (query_result[1] + query_result[3] + query_result[5])
-
-            # calculate the rates, filtering for zero values in denominators
-            if (int(query_result[0]) + int(query_result[2])) == 0 and int(query_result[4]) == 0:
-                # return 'None' for all the rates since all denominators will be zero
-                result_dict['match_rate_hashes'] = 'None'
-                result_dict['match_rate_cookies'] = 'None'
-                result_dict['match_rate_full'] = 'None'
+            # the rates are 'None' wherever their denominators are zero
+            match_result = MatchResult.from_query(pixel.pixel_id, query_result)
+
+            if match_result.maid_chpck == 0 and match_result.cookie_chpck == 0:
                 self.logger.warning("The match results have zero values for both maid and cookie dlx_chpck counts "
-                                    "for pixel: {}".format(ticket[1][0]))
-
-            elif (int(query_result[0]) + int(query_result[2])) == 0:
-                # return 'None' for hashes and total but return a value for the cookies
-                result_dict['match_rate_hashes'] = 'None'
-                result_dict['match_rate_cookies'] = float(format(float(query_result[5]) / float(query_result[4]),
-                                                                 '.3f'))
-                result_dict['match_rate_full'] = 'None'
+                                    "for pixel: {}".format(pixel.pixel_id))
+            elif match_result.maid_chpck == 0:
                 self.logger.warning("The match results have zero values for maid dlx_chpck counts "
-                                    "for pixel: {}".format(ticket[1][0]))
-
-            elif int(query_result[4]) == 0:
-                # return 'None' for cookies and total but return a value for the hashes
-                result_dict['match_rate_hashes'] = float(format((float(query_result[1]) + float(query_result[3])) /
-                                                                (float(query_result[0]) + float(query_result[2])),
-                                                                '.3f'))
-                result_dict['match_rate_cookies'] = 'None'
-                result_dict['match_rate_full'] = 'None'
+                                    "for pixel: {}".format(pixel.pixel_id))
+            elif match_result.cookie_chpck == 0:
                 self.logger.warning("The match results have zero values for cookie dlx_chpck counts "
-                                    "for pixel: {}".format(ticket[1][0]))
-
+                                    "for pixel: {}".format(pixel.pixel_id))
             else:
-                # calculate the rates required for analysis and add to dictionary
-                result_dict['match_rate_hashes'] = float(format((float(query_result[1]) + float(query_result[3])) /
-                                                                (float(query_result[0]) + float(query_result[2])),
-                                                                '.3f'))
-                result_dict['match_rate_cookies'] = float(format(float(query_result[5]) / float(query_result[4]),
-                                                                 '.3f'))
-                result_dict['match_rate_full'] = float(format((float(query_result[1]) + float(query_result[3]) +
-                                                               float(query_result[5])) / (float(query_result[0]) +
-                                                                                          float(query_result[2]) +
-                                                                                          float(query_result[4])),
-                                                              '.3f'))
-                self.logger.info("The match results were successfully created for pixel: {}".format(ticket[1][0]))
+                self.logger.info("The match results were successfully created for pixel: {}".format(pixel.pixel_id))
 
         except Exception as e:
             self.logger.error("Either there are no results or there is a problem with the data "
-                              "for pixel {} => {}".format(ticket[1][0], e))
-            result_dict = None
+                              "for pixel {} => {}".format(pixel.pixel_id, e))
+            match_result = None
 
         else:
             # check the count results to eliminate all-zeros query results from the json run file, and trigger a
             # different comment post
-            if sum({k: v for (k, v) in result_dict.items() if isinstance(v, int)}.values()) == 0:
-                result_dict = None
+            if match_result.is_empty():
+                match_result = None
             else:
-                self.results_dict[ticket[1][0]] = result_dict
+                self.results_dict[pixel.pixel_id] = match_result.to_dict()
+
+        # compare against the results last posted to Jira, unchanged results skip all jira calls for this pixel
+        delta = self.results_delta(match_result)
+        if delta is not None and not delta['changed']:
+            # the posted results stay the baseline, so small changes over several runs still add up to a comment
+            self.latest_entry(pixel, match_result, self.previous_results[pixel.pixel_id]['posted'])
+            self.logger.info("The match results for pixel {} are unchanged since the results last posted, no "
+                             "comments posted to Jira Ticket: {}".format(pixel.pixel_id, ticket.key))
+            self.completed_pixels.add(pixel.pixel_id)
+            self.logger.info("End of thread\n")
+            return
 
         # call the measurement ticket manager to collect measurement ticket information
         meas_ticket, reporter, lead_analyst = self.parent_ticket_manager(ticket)
 
         # comment out the lines below for test runs without jira ticket comment posting
-        self.comments_manager(ticket, result_dict, None, None)
-        self.comments_manager(meas_ticket, result_dict, reporter, lead_analyst)
+        self.comments_manager(ticket, match_result, None, None, delta)
+        self.comments_manager(meas_ticket, match_result, reporter, lead_analyst, delta)
+        if match_result is not None:
+            self.latest_entry(pixel, match_result, match_result.to_dict())
+        self.completed_pixels.add(pixel.pixel_id)
+
+        self.logger.info("End of thread\n")
+
+    # Records the pixel's entry for the latest results file, its newest results and the results last posted to Jira
+    #
+    def latest_entry(self, pixel, match_result, posted):
+        self.latest_dict[pixel.pixel_id] = {'run_id': self.run_id, 'end_date': pixel.end_date,
+                                            'results': match_result.to_dict(), 'posted': posted}
+
+    # Loads the latest results file, a dictionary of pixel id => run id, campaign end date, newest results and the
+    # results last posted to Jira
+    #
+    def latest_results_load(self):
+        if not os.path.isfile(self.latest_file_name):
+            self.logger.info("No latest results file found, full comments will be posted for all pixels")
+            return {}
+        try:
+            with open(self.latest_file_name, 'r') as fp:
+                latest_results = json.load(fp)
+        except Exception as e:
+            self.logger.error("There was a problem reading the latest results file {} => {}"
+                              .format(self.latest_file_name, e))
+            return {}
+        else:
+            self.logger.info("Loaded the latest results of {} pixels from: {}".format(len(latest_results),
+                                                                                     self.latest_file_name))
+            return latest_results
+
+    # Compares a pixel's match result with the results last posted to Jira, returns None when there is nothing to
+    # compare, otherwise a dictionary of (posted, current, change) per count and rate with a flag for a change over
+    # the thresholds - counts are compared by relative change and rates by absolute change
+    #
+    def results_delta(self, match_result):
+        if self.comment_mode != 'delta' or match_result is None:
+            return None
+        previous = self.previous_results.get(match_result.pixel_id)
+        if previous is None:
+            return None
+        previous = previous['posted']
+        result_dict = match_result.to_dict()
+
+        delta = {'changed': False}
+        for key in self.count_keys:
+            prev_value, value = int(previous.get(key, 0)), int(result_dict[key])
+            delta[key] = (prev_value, value, value - prev_value)
+            if prev_value == 0:
+                if value != 0:
+                    delta['changed'] = True
+            elif abs(value - prev_value) / float(prev_value) > self.count_threshold:
+                delta['changed'] = True
+
+        for key in self.rate_keys:
+            prev_value, value = previous.get(key, 'None'), result_dict[key]
+            if isinstance(prev_value, float) and isinstance(value, float):
+                change = float(format(value - prev_value, '.3f'))
+                if abs(change) > self.rate_threshold:
+                    delta['changed'] = True
+            else:
+                change = 'None'
+                if prev_value != value:
+                    delta['changed'] = True
+            delta[key] = (prev_value, value, change)
+
+        return delta
+
+    # Posts the fail comments for a pixel without impressions, no match query is run for it
+    #
+    def inactive_manager(self, ticket):
+        pixel = ticket.pixel
+        self.logger.info("The pixel_id is {} and the campaign name is {}".format(pixel.pixel_id, pixel.campaign_name))
+        self.logger.warning("There are no impressions since the start date for pixel: {}, the match query was not "
+                            "run".format(pixel.pixel_id))
+
+        meas_ticket, reporter, lead_analyst = self.parent_ticket_manager(ticket)
+
+        # comment out the lines below for test runs without jira ticket comment posting
+        self.comments_manager(ticket, None, None, None)
+        self.comments_manager(meas_ticket, None, reporter, lead_analyst)
+        self.completed_pixels.add(pixel.pixel_id)
 
         self.logger.info("End of thread\n")
 
@@ -232,40 +504,47 @@ class MobileIDMatchManager(object):
     #
     def parent_ticket_manager(self, ticket):
         # find the parent ticket and associated reporter and lead analyst
-        meas_ticket = [self.jira_pars.find_parent_ticket(ticket[0]), [ticket[1][0], ticket[1][1], ticket[1][2],
-                                                                      ticket[1][3]]]
-        reporter, lead_analyst = self.jira_pars.ticket_info_pull(meas_ticket[0])
+        meas_ticket = WorkItem(self.jira_pars.find_parent_ticket(ticket.key), ticket.pixel)
+        reporter, lead_analyst = self.jira_pars.ticket_info_pull(meas_ticket.key)
 
         return meas_ticket, reporter, lead_analyst
 
     # Confirms output of query, posts results to Jira ticket
     #
-    def comments_manager(self, ticket, result, reporter, lead_analyst):
+    def comments_manager(self, ticket, result, reporter, lead_analyst, delta=None):
         # check for results, then check to see if ticket is pixel or measurement level
-        if result is not None:
+        if result is not None and delta is not None:
+            self.jira_pars.add_match_delta_comment(ticket, result, delta, reporter, lead_analyst)
+            self.logger.info("The changes in counts and match rates since the results last posted have been added as "
+                             "a comment to Jira Ticket: " + str(ticket.key))
+        elif result is not None:
             if reporter is None and lead_analyst is None:
                 self.jira_pars.add_match_count_comment(ticket, result, None, None)
                 self.logger.info("The maid, cookie and total counts along with match rates have been added as a comment"
-                                 " to Jira Ticket: " + str(ticket[0]))
+                                 " to Jira Ticket: " + str(ticket.key))
             else:
                 self.jira_pars.add_match_count_comment(ticket, result, reporter, lead_analyst)
                 self.logger.info("The maid, cookie and total counts along with match rates have been added as a comment"
-                                 " to Jira Ticket: " + str(ticket[0]))
+                                 " to Jira Ticket: " + str(ticket.key))
         else:
             if reporter is None and lead_analyst is None:
                 self.jira_pars.add_match_fail_comment(ticket, None, None)
-                self.logger.info("The ticket alert has been added as a comment to Jira Ticket: {}".format(ticket[0]))
+                self.logger.info("The ticket alert has been added as a comment to Jira Ticket: {}".format(ticket.key))
             else:
                 self.jira_pars.add_match_fail_comment(ticket, reporter, lead_analyst)
-                self.logger.info("The ticket alert has been added as a comment to Jira Ticket: {}".format(ticket[0]))
+                self.logger.info("The ticket alert has been added as a comment to Jira Ticket: {}".format(ticket.key))
 
     # Creates the Email Manager instance, launches the emailer module
     #
     def emailer(self, pixel):
         cm_email = EmailManager(pixel, self.email_subject, self.email_to, self.email_from, self.email_cc)
-        cm_email.cm_emailer()
+        if pixel:
+            cm_email.cm_emailer()
+        else:
+            cm_email.no_pixel_emailer()
 
-    # Writes the run data to a json file as a history repository and potential further processing
+    # Writes the run data to a json file as a history repository and potential further processing, then merges the
+    # run into the latest results file
     #
     def json_file_write(self):
         try:
@@ -277,22 +556,24 @@ class MobileIDMatchManager(object):
                               "/zfs1/operations_mounted => {}".format(e))
         else:
             self.logger.info("The results have been posted to: {}".format(self.results_file_name))
+        self.latest_file_write()
 
-    # Checks the log directory for all files and removes those after a specified number of days
+    # Merges the run's entries into the latest results file, through a temporary file so a crash never leaves it
+    # partial, the entries of pixels past their campaign end date are dropped
     #
-    def purge_files(self, purge_days, purge_dir):
+    def latest_file_write(self):
+        today = datetime.now().strftime('%Y%m%d')
+        latest_results = self.latest_results_load() if os.path.isfile(self.latest_file_name) else {}
+        latest_results.update(self.latest_dict)
+        latest_results = {k: v for (k, v) in latest_results.items() if v['end_date'] > today}
+        temp_file = self.latest_file_name + '.tmp'
         try:
-            self.logger.info("\n\t\tRemove {} days old files from the {} directory".format(purge_days, purge_dir))
-            now = time.time()
-            for file_purge in os.listdir(purge_dir):
-                f_obs_path = os.path.join(purge_dir, file_purge)
-                if os.stat(f_obs_path).st_mtime < now - int(purge_days) * 86400 and f_obs_path.split(".")[-1] == "log":
-                    time_stamp = time.strptime(time.strftime('%Y-%m-%d %H:%M:%S',
-                                                             time.localtime(os.stat(f_obs_path).st_mtime)),
-                                               '%Y-%m-%d %H:%M:%S')
-                    self.logger.info("Removing File [{}] with timestamp [{}]".format(f_obs_path, time_stamp))
-
-                    os.remove(f_obs_path)
-
+            with open(temp_file, 'w') as fp:
+                json.dump(latest_results, fp, indent=4)
+            os.replace(temp_file, self.latest_file_name)
         except Exception as e:
-            self.logger.error("{}".format(e))
+            self.logger.error("There was a problem writing the latest results file {} => {}"
+                              .format(self.latest_file_name, e))
+        else:
+            self.logger.info("The latest results for {} pixels have been posted to: {}"
+                             .format(len(latest_results), self.latest_file_name))
@@ -4,13 +4,15 @@
 # and search and data collection and organization
 #
 import json
-import requests
 from datetime import datetime
 import logging
 
+from pixel_records import PixelRecord
+
 
 class MobileSSIDSearchManager(object):
-    def __init__(self):
+    def __init__(self, http_manager):
+        self.http_manager = http_manager
         self.key_id = 'id'
         self.key_name = 'name'
         self.key_campaigns = 'campaigns'
@@ -22,7 +24,7 @@ class MobileSSIDSearchManager(object):
     #
     def api_call(self, api_url):
         try:
-            response = requests.get(api_url)
+            response = self.http_manager.session().get(api_url)
         except Exception as e:
             self.logger.error("Failed to create a response object => {}".format(e))
             return None
@@ -32,42 +34,37 @@ class MobileSSIDSearchManager(object):
 
     # Find the mobile ssid number from the api call return, ssid number is the first level down in dictionary, then
     # return a list of all the found ssid numbers and their corresponding names, only pixels are returned that have
-    # a start date and a future end date, returns a list of lists
+    # a start date and a future end date, returns a list of pixel records - the pixels left out are logged
     #
     def mobile_ssid_search(self, pixel_dict):
         pixel_name_list = []
-        for k, v in pixel_dict.items():
-            # get the api returned pixel number total
-            if k == 'pixels':
-                # go down one level in dictionary to find campaign specific data
-                for item1 in v:
-                    mobile_id = []
-                    for k1, v1 in item1.items():
-                        # find the campaign pixel number in the first level down
-                        if k1 == self.key_id:
-                            mobile_id.append(str(v1))
-                        # find the associated campaign name
-                        if k1 == self.key_name:
-                            mobile_id.append(v1)
-                        # go down one more level in dictionary to find campaign dates
-                        if k1 == self.key_campaigns:
-                            item2 = v1[0]
-                            for k2, v2 in item2.items():
-                                if k2 == self.start_date:
-                                    # convert start date to a string for query use
-                                    start_date = v2.split('T')[0].replace('-', '').strip()
-                                    mobile_id.append(start_date)
-                                if k2 == self.end_date:
-                                    # convert end date to a string for query use
-                                    end_date = v2.split('T')[0].replace('-', '').strip()
-                                    # test for a future end date, if end date already passed, don't include
-                                    if datetime.now().strftime('%Y%m%d') < end_date:
-                                        mobile_id.append(end_date)
-                    # filter out any results that don't include a start date, it could happen
-                    if len(mobile_id) == 4:
-                        pixel_name_list.append(mobile_id)
+        today = datetime.now().strftime('%Y%m%d')
+        # go down one level in dictionary to find campaign specific data
+        for item1 in pixel_dict.get('pixels', []):
+            pixel_id = str(item1.get(self.key_id))
+            campaigns = item1.get(self.key_campaigns) or [{}]
+            # go down one more level in dictionary to find campaign dates, converted to strings for query use
+            start_date = self.date_convert(campaigns[0].get(self.start_date))
+            end_date = self.date_convert(campaigns[0].get(self.end_date))
+
+            # filter out any results that don't include a start and end date, it could happen
+            if item1.get(self.key_id) is None or not start_date or not end_date:
+                self.logger.warning("Pixel {} left out, the campaign start or end date is missing".format(pixel_id))
+            # test for a future end date, if end date already passed, don't include
+            elif end_date <= today:
+                self.logger.info("Pixel {} left out, the campaign ended on {}".format(pixel_id, end_date))
+            else:
+                # a pixel without a campaign name is kept, with an empty name for the comments and alert emails
+                pixel_name_list.append(PixelRecord(pixel_id, item1.get(self.key_name) or '', start_date, end_date))
         return pixel_name_list
 
+    # Converts an api date-time to a YYYYMMDD string, returns None for a missing date
+    #
+    @staticmethod
+    def date_convert(api_date):
+        if api_date:
+            return api_date.split('T')[0].replace('-', '').strip()
+
     # Optional method to load json dictionary from a json file
     #
     @staticmethod
@@ -94,5 +91,6 @@ class MobileSSIDSearchManager(object):
         self.logger.info("Pixel id\t\tStart Date\t\tEnd Date\t\t\t\t\t\t\t\t\tCampaign Name\n")
 
         for pixel in pixel_list:
-            self.logger.info(" {pixel_id}\t\t\t{cam_name}\t\t{start_date}\t\t{end_date}"
-                             .format(pixel_id=pixel[0], cam_name=pixel[2], start_date=pixel[3], end_date=pixel[1]))
+            self.logger.info(" {pixel_id}\t\t\t{start_date}\t\t{end_date}\t\t{cam_name}"
+                             .format(pixel_id=pixel.pixel_id, start_date=pixel.start_date, end_date=pixel.end_date,
+                                     cam_name=pixel.campaign_name))
@@ -0,0 +1,104 @@
+# pixel_records module
+# Module holds the classes => PixelRecord - a pixel and its campaign name, start and end dates
+#                             WorkItem - a pixel with its Jira ticket key, the unit of work for the match queries
+#                             MatchResult - the six match query counts of a pixel, with totals and match rates
+# Classes are slotted, immutable records passed through every stage of the pipeline in place of positional lists
+#
+from collections import namedtuple
+import struct
+
+
+class PixelRecord(namedtuple('PixelRecord', ['pixel_id', 'campaign_name', 'start_date', 'end_date'])):
+    __slots__ = ()
+
+
+class WorkItem(namedtuple('WorkItem', ['key', 'pixel'])):
+    __slots__ = ()
+
+    # Returns the item as a json serializable list
+    #
+    def to_json(self):
+        return [self.key, list(self.pixel)]
+
+    # Creates the item from its json list
+    #
+    @classmethod
+    def from_json(cls, data):
+        return cls(data[0], PixelRecord(*data[1]))
+
+
+class MatchResult(namedtuple('MatchResult', ['pixel_id', 'hashed_chpck', 'hashed_hhid', 'unhashed_chpck',
+                                             'unhashed_hhid', 'cookie_chpck', 'cookie_hhid'])):
+    __slots__ = ()
+    # the counts stay plain ints, they are only range checked against a signed 64 bit integer, the width of the Hive
+    # count() results, by packing them through this format
+    counts_format = struct.Struct('<6q')
+
+    # Creates the result from the cleaned query output, the first six values are the hashed, un-hashed and cookie
+    # dlx_chpck and hhid counts, raises an error for missing, negative or non-integer counts and for counts outside
+    # the signed 64 bit range
+    #
+    @classmethod
+    def from_query(cls, pixel_id, query_result):
+        counts = cls.counts_format.unpack(cls.counts_format.pack(*query_result[:6]))
+        if min(counts) < 0:
+            raise ValueError("negative count in query result {}".format(query_result))
+        return cls(pixel_id, *counts)
+
+    @property
+    def total_chpck(self):
+        return self.hashed_chpck + self.unhashed_chpck + self.cookie_chpck
+
+    @property
+    def total_hhid(self):
+        return self.hashed_hhid + self.unhashed_hhid + self.cookie_hhid
+
+    @property
+    def maid_chpck(self):
+        return self.hashed_chpck + self.unhashed_chpck
+
+    # The match rates, rounded to three places, or 'None' when either the maid or the cookie counts are zero
+    #
+    @property
+    def match_rate_hashes(self):
+        if self.maid_chpck == 0:
+            return 'None'
+        return self.rate(self.hashed_hhid + self.unhashed_hhid, self.maid_chpck)
+
+    @property
+    def match_rate_cookies(self):
+        if self.cookie_chpck == 0:
+            return 'None'
+        return self.rate(self.cookie_hhid, self.cookie_chpck)
+
+    @property
+    def match_rate_full(self):
+        if self.maid_chpck == 0 or self.cookie_chpck == 0:
+            return 'None'
+        return self.rate(self.total_hhid, self.total_chpck)
+
+    # Checks for an all-zeros result
+    #
+    def is_empty(self):
+        return not any(self[1:])
+
+    # Returns the counts and rates as the dictionary saved in the results json file
+    #
+    def to_dict(self):
+        return {
+            'hashed_chpck': self.hashed_chpck,
+            'hashed_hhid': self.hashed_hhid,
+            'unhashed_chpck': self.unhashed_chpck,
+            'unhashed_hhid': self.unhashed_hhid,
+            'cookie_chpck': self.cookie_chpck,
+            'cookie_hhid': self.cookie_hhid,
+            'total_chpck': self.total_chpck,
+            'total_hhid': self.total_hhid,
+            'match_rate_hashes': self.match_rate_hashes,
+            'match_rate_cookies': self.match_rate_cookies,
+            'match_rate_full': self.match_rate_full
+        }
+
+    @staticmethod
+    def rate(numerator, denominator):
+        return float(format(float(numerator) / float(denominator), '.3f'))
@@ -1,14 +1,21 @@
 # qubole_manager module
 # Module holds the class => QuboleManager - manages Qubole search interface
-# Class responsible for all Qubole related interactions including query launch and results retrieval
+# Class responsible for all Qubole related interactions including query launch and results retrieval, the qds_sdk
+# import and api configuration are deferred until the first query is launched
 #
-from qds_sdk.commands import *
 import io
+import time
+import threading
 from contextlib import redirect_stdout
 import logging
 
+from log_manager import LogManager
+
 
 class QuboleManager(object):
+    configured_token = None
+    configure_lock = threading.Lock()
+
     def __init__(self, name, qubole_token, cluster_label, query):
         self.name = name
         self.qubole_token = qubole_token
@@ -19,7 +26,30 @@ class QuboleManager(object):
     # Launches query, collects,converts and returns results
     #
     def get_results(self):
-        Qubole.configure(api_token=self.qubole_token)
+        output = self.get_raw_results()
+        if output is not None:
+            clean_results = []
+            # takes output from quoble, converts to ascii, strips whitespace then splits to form a list
+            results = output.strip().split('\t')
+            # remove any non-numeric characters from list elements
+            for item in results:
+                item = ''.join(n for n in item if n.isdigit())
+                # finally, remove any blank items left in list
+                if item != '':
+                    clean_results.append(int(item))
+
+            return clean_results
+
+    # Launches query, collects and returns the results as a list of rows, each a list of the tab separated fields
+    #
+    def get_rows(self):
+        output = self.get_raw_results()
+        if output is not None:
+            return [line.split('\t') for line in output.strip().splitlines() if line.strip()]
+
+    # Launches query, collects and returns the results as unconverted text, used directly for explain plans
+    #
+    def get_raw_results(self):
         try:
             # launches the qubole query
             resp = self.launch_query()
@@ -28,39 +58,44 @@ class QuboleManager(object):
             self.logger.error("Query run failed => {}".format(e))
 
         else:
-            clean_results = []
             output = io.BytesIO()
             with redirect_stdout(output):
                 resp.get_results(fp=output, inline=True)
                 output.seek(0)
-                # takes output from quoble, converts to ascii, strips whitespace then splits to form a list
-                results = (output.read()).decode("utf-8").strip().split('\t')
-                # remove any non-numeric characters from list elements
-                for item in results:
-                    item = ''.join(n for n in item if n.isdigit())
-                    # finally, remove any blank items left in list
-                    if item is not '':
-                        clean_results.append(int(item))
-
-            return clean_results
+                # takes output from quoble and converts to ascii
+                return (output.read()).decode("utf-8")
 
     # Launches query and checks periodically for completion
     #
     def launch_query(self):
+        from qds_sdk.commands import HiveCommand
+        self.qubole_configure()
         done = False
         attempt = 1
         while not done and attempt <= 3:
             resp = HiveCommand.create(query=self.query, retry=3, label=self.cluster_label, name=", ".join(self.name))
+            LogManager.set_context(command_id=resp.id)
             final_status = self.watch_status(resp.id)
             done = HiveCommand.is_success(final_status)
             attempt += 1
             if done:
                 return resp
 
+    # Configures the Qubole api once per token for all instances and threads
+    #
+    def qubole_configure(self):
+        from qds_sdk.qubole import Qubole
+        with QuboleManager.configure_lock:
+            if QuboleManager.configured_token != self.qubole_token:
+                Qubole.configure(api_token=self.qubole_token)
+                QuboleManager.configured_token = self.qubole_token
+
     # Monitors the Hive query status, returns when finished
     #
     @ staticmethod
     def watch_status(job_id):
+        from qds_sdk.commands import HiveCommand
+        from qds_sdk.qubole import Qubole
         cmd = HiveCommand.find(job_id)
         while not HiveCommand.is_done(cmd.status):
             time.sleep(Qubole.poll_interval)
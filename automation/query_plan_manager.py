@@ -0,0 +1,173 @@
+# query_plan_manager module
+# Module holds the class => QueryPlanManager - manages the dry-run planning of the match queries
+# Class responsible for building every pixel query, estimating the partitions and bytes each will scan (via Hive
+# explain plans run through Qubole, with a partition count fallback), and reporting a plan with a suggested query pool
+# size, no match queries are submitted and nothing is posted to Jira
+#
+from datetime import datetime
+from multiprocessing.dummy import Pool as ThreadPool
+import re
+import logging
+
+from log_manager import LogManager
+from qubole_manager import QuboleManager
+from hhid_pixel_query import MaidHHIDMatch
+
+
+class QueryPlanManager(object):
+    def __init__(self, pixel_list, qubole_token, cluster_label, explain_queries, partition_bytes, max_batch_bytes,
+                 query_pool_size):
+        self.pixel_list = pixel_list
+        self.qubole_token = qubole_token
+        self.cluster_label = cluster_label
+        self.explain_queries = explain_queries
+        self.partition_bytes = int(partition_bytes)
+        self.max_batch_bytes = int(max_batch_bytes)
+        self.query_pool_size = int(query_pool_size)
+        # the match query scans unified_impression once for each of hashed, un-hashed and cookie ids
+        self.impression_scans = 3
+        self.scan_pattern = re.compile(r'TableScan.*?Statistics: Num rows: \d+ Data size: (\d+)', re.DOTALL)
+        self.plan = []
+        self.logger = logging.getLogger(__name__)
+
+    # Builds the plan for every pixel, then logs and prints the plan report, the api pixel count shows how many pixels
+    # were left out for want of a Jira ticket
+    #
+    def plan_manager(self, api_pixels, activity_prefilter):
+        plan_pool = ThreadPool(processes=max(1, min(len(self.pixel_list), 10)))
+        try:
+            self.plan = plan_pool.map(self.pixel_plan, self.pixel_list)
+            plan_pool.close()
+            plan_pool.join()
+        except Exception as e:
+            self.logger.error("Dry-run query planning failed => {}".format(e))
+        else:
+            self.plan_report(api_pixels, activity_prefilter)
+
+    # Estimates the partitions and bytes scanned for a single pixel, uses the explain plan when available and falls
+    # back to the partition count times the configured partition size
+    #
+    def pixel_plan(self, pixel):
+        partitions = self.partition_count(pixel.start_date) * self.impression_scans
+        scan_bytes = None
+        source = 'partitions'
+
+        if self.explain_queries:
+            scan_bytes = self.explain_bytes(pixel)
+            if scan_bytes is not None:
+                source = 'explain'
+
+        if scan_bytes is None:
+            scan_bytes = partitions * self.partition_bytes
+
+        return {'pixel_id': pixel.pixel_id, 'campaign_name': pixel.campaign_name, 'start_date': pixel.start_date,
+                'partitions': partitions, 'scan_bytes': scan_bytes, 'source': source}
+
+    # Counts the daily DATA_DATE partitions between the campaign start date and today
+    #
+    @staticmethod
+    def partition_count(start_date):
+        try:
+            days = (datetime.now() - datetime.strptime(start_date, '%Y%m%d')).days + 1
+        except ValueError:
+            return 0
+        return max(days, 0)
+
+    # Runs the explain plan for the pixel query through Qubole and sums the table scan sizes it reports
+    #
+    def explain_bytes(self, pixel):
+        # set the logging level of Qubole to "WARNING" to filter out 'info level' logging message deluge
+        logging.getLogger("qds_connection").setLevel(logging.WARNING)
+
+        qubole = QuboleManager(("explain", "".join(str(pixel.pixel_id))), self.qubole_token, self.cluster_label,
+                               MaidHHIDMatch.explain_impressions_query(pixel.pixel_id, pixel.start_date))
+        try:
+            explain_plan = qubole.get_raw_results()
+        finally:
+            # the pool threads are reused, the explain command id stays off their later records
+            LogManager.clear_context()
+        if not explain_plan:
+            self.logger.warning("No explain plan returned for pixel {}, using partition estimate"
+                                .format(pixel.pixel_id))
+            return None
+
+        scan_sizes = [int(size) for size in self.scan_pattern.findall(explain_plan)]
+        if not scan_sizes:
+            self.logger.warning("No table scan statistics in explain plan for pixel {}, using partition "
+                                "estimate".format(pixel.pixel_id))
+            return None
+        return sum(scan_sizes)
+
+    # Returns the query pool size that keeps the concurrent scan within the configured maximum, the largest number of
+    # pixel queries that can run at once with the largest scans running together, at least one
+    #
+    def pool_size_plan(self):
+        pool_size = scan_bytes = 0
+        for item in sorted(self.plan, key=lambda x: x['scan_bytes'], reverse=True):
+            if scan_bytes + item['scan_bytes'] > self.max_batch_bytes:
+                break
+            pool_size += 1
+            scan_bytes += item['scan_bytes']
+        return max(pool_size, 1)
+
+    # Returns the expected scan of the largest pixels running together in a pool of the given size
+    #
+    def peak_scan(self, pool_size):
+        return sum(sorted([item['scan_bytes'] for item in self.plan], reverse=True)[:pool_size])
+
+    # Logs and prints the plan, per pixel estimates followed by the run totals and the suggested query_pool_size
+    #
+    def plan_report(self, api_pixels, activity_prefilter):
+        total_partitions = sum(item['partitions'] for item in self.plan)
+        total_bytes = sum(item['scan_bytes'] for item in self.plan)
+        # a query_pool_size of 0 runs one thread per pixel
+        pool_size = min(self.query_pool_size, len(self.plan)) if self.query_pool_size else len(self.plan)
+
+        if self.explain_queries:
+            header = "Dry-run query plan - only EXPLAIN queries submitted, no Jira comments posted\n"
+        else:
+            header = "Dry-run query plan - no queries submitted, no Jira comments posted\n"
+        lines = [header,
+                 "Pixel id\t\tStart Date\t\tPartitions\t\tScan Size\t\tSource\t\tCampaign Name"]
+        for item in self.plan:
+            lines.append(" {pixel_id}\t\t\t{start_date}\t\t{partitions}\t\t\t{scan}\t\t{source}\t\t{name}"
+                         .format(pixel_id=item['pixel_id'], start_date=item['start_date'],
+                                 partitions=item['partitions'], scan=self.size_format(item['scan_bytes']),
+                                 source=item['source'], name=item['campaign_name']))
+        lines.append("")
+        lines.append("Pixels from the api:     {}".format(api_pixels))
+        lines.append("Pixels left out:         {} without a Jira ticket".format(api_pixels - len(self.plan)))
+        lines.append("Pixels to query:         {}".format(len(self.plan)))
+        if activity_prefilter:
+            # the activity query scans unified_impression itself, so the dry-run leaves it to the real run
+            lines.append("Activity prefilter:      not applied in the dry-run, pixels without impressions are included "
+                         "and the real run may query fewer")
+        lines.append("Total partitions:        {}".format(total_partitions))
+        lines.append("Expected total scan:     {}".format(self.size_format(total_bytes)))
+        lines.append("Max concurrent scan:     {} (max_batch_scan_bytes)"
+                     .format(self.size_format(self.max_batch_bytes)))
+        lines.append("Current query_pool_size: {} => {} threads, peak concurrent scan {}"
+                     .format(self.query_pool_size, pool_size, self.size_format(self.peak_scan(pool_size))))
+        if self.plan:
+            suggested_size = self.pool_size_plan()
+            lines.append("Suggested query_pool_size: {} => peak concurrent scan {}"
+                         .format(suggested_size, self.size_format(self.peak_scan(suggested_size))))
+        for item in self.plan:
+            if item['scan_bytes'] > self.max_batch_bytes:
+                lines.append("Warning: pixel {} alone is expected to scan {}, over the max concurrent scan"
+                             .format(item['pixel_id'], self.size_format(item['scan_bytes'])))
+
+        for line in lines:
+            self.logger.info(line)
+        print("\n".join(lines))
+
+    # Formats a byte count into a readable size
+    #
+    @staticmethod
+    def size_format(num_bytes):
+        size = float(num_bytes)
+        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+            if size < 1024.0:
+                return "{:.1f} {}".format(size, unit)
+            size /= 1024.0
+        return "{:.1f} PB".format(size)
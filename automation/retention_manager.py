@@ -0,0 +1,203 @@
+# retention_manager module
+# Module holds the class => RetentionManager - manages the retention of the log and results files on zfs1
+# Class responsible for compressing the log and results json files after a set age, rolling older results files into
+# monthly zip archives with a small json index for lookups, and removing files past their retention period, each
+# directory is read with a single scandir pass and each file stat is taken once, the work runs in a background thread
+# so it never delays the main run
+#
+from datetime import datetime
+import threading
+import zipfile
+import shutil
+import gzip
+import json
+import time
+import os
+import re
+import logging
+
+
+class RetentionManager(object):
+    def __init__(self, app_name, log_dir, log_compress_days, log_retention_days, results_dir, results_compress_days,
+                 results_archive_days, results_retention_days, active_files):
+        self.app_name = app_name
+        self.log_dir = log_dir
+        self.log_compress_days = int(log_compress_days)
+        self.log_retention_days = int(log_retention_days)
+        self.results_dir = results_dir
+        self.results_compress_days = int(results_compress_days)
+        self.results_archive_days = int(results_archive_days)
+        self.results_retention_days = int(results_retention_days)
+        # the files in use by the current run are never touched
+        self.active_files = set(os.path.abspath(f) for f in active_files)
+        self.archive_dir = os.path.join(results_dir, 'archive')
+        self.index_file = os.path.join(self.archive_dir, '{}_index.json'.format(app_name))
+        self.log_pattern = re.compile(r'^{}_.*\.log(\.gz)?$'.format(re.escape(app_name)))
+        self.results_pattern = re.compile(r'^{}_(\d{{8}}-\d{{6}})\.json(\.gz)?$'.format(re.escape(app_name)))
+        self.archive_pattern = re.compile(r'^{}_(\d{{6}})\.zip$'.format(re.escape(app_name)))
+        self.thread = None
+        self.now = time.time()
+        self.logger = logging.getLogger(__name__)
+
+    # Starts the retention pass in a background thread
+    #
+    def start(self):
+        self.thread = threading.Thread(target=self.retention_manager, name='Retention')
+        self.thread.start()
+
+    # Replaces the files in use that are never touched, for a daemon that has rolled over to a new log file
+    #
+    def set_active_files(self, active_files):
+        self.active_files = set(os.path.abspath(f) for f in active_files)
+
+    # Checks whether a background retention pass is still running
+    #
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # Waits for the background retention pass to finish, or for at most timeout seconds, returns whether it finished
+    #
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return not self.running()
+
+    # Runs the log and the results retention passes
+    #
+    def retention_manager(self):
+        self.now = time.time()
+        try:
+            self.log_retention()
+        except Exception as e:
+            self.logger.error("Log file retention failed for {} => {}".format(self.log_dir, e))
+        try:
+            self.results_retention()
+        except Exception as e:
+            self.logger.error("Results file retention failed for {} => {}".format(self.results_dir, e))
+
+    # Lists the directory once, returns (name, path, mtime) for the files matching the pattern
+    #
+    def scan(self, directory, pattern):
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if pattern.match(entry.name) and entry.is_file() and \
+                        os.path.abspath(entry.path) not in self.active_files:
+                    files.append((entry.name, entry.path, entry.stat().st_mtime))
+        return files
+
+    # Returns the age in days of a file modified at mtime
+    #
+    def age_days(self, mtime):
+        return (self.now - mtime) / 86400.0
+
+    # Deletes the log files past retention and compresses the others past the compress age
+    #
+    def log_retention(self):
+        removed = compressed = 0
+        for name, path, mtime in self.scan(self.log_dir, self.log_pattern):
+            age = self.age_days(mtime)
+            if age > self.log_retention_days:
+                os.remove(path)
+                removed += 1
+            elif age > self.log_compress_days and not name.endswith('.gz'):
+                self.compress(path, mtime)
+                compressed += 1
+        self.logger.info("Log retention: {} files removed, {} files compressed in {}"
+                         .format(removed, compressed, self.log_dir))
+
+    # Archives the results files past the archive age, compresses the others past the compress age and deletes the
+    # monthly archives past retention
+    #
+    def results_retention(self):
+        archived = compressed = 0
+        to_archive = {}
+        for name, path, mtime in self.scan(self.results_dir, self.results_pattern):
+            age = self.age_days(mtime)
+            if age > self.results_archive_days:
+                run_stamp = self.results_pattern.match(name).group(1)
+                to_archive.setdefault(run_stamp[:6], []).append((run_stamp, name, path))
+            elif age > self.results_compress_days and not name.endswith('.gz'):
+                self.compress(path, mtime)
+                compressed += 1
+
+        if to_archive or os.path.isdir(self.archive_dir):
+            os.makedirs(self.archive_dir, exist_ok=True)
+            index = self.index_load()
+            for month, results_files in sorted(to_archive.items()):
+                archived += self.archive(month, results_files, index)
+            removed = self.archive_retention(index)
+            self.index_write(index)
+        else:
+            removed = 0
+        self.logger.info("Results retention: {} files archived, {} files compressed, {} monthly archives removed in {}"
+                         .format(archived, compressed, removed, self.results_dir))
+
+    # Gzips a file through a temporary file, keeping its modification time so its age carries over
+    #
+    def compress(self, path, mtime):
+        temp_path = path + '.gz.tmp'
+        with open(path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.utime(temp_path, (mtime, mtime))
+        os.replace(temp_path, path + '.gz')
+        os.remove(path)
+
+    # Adds results files to their month's zip archive as deflated json, records them in the index, then removes the
+    # originals, returns the number archived
+    #
+    def archive(self, month, results_files, index):
+        archive_name = '{}_{}.zip'.format(self.app_name, month)
+        with zipfile.ZipFile(os.path.join(self.archive_dir, archive_name), 'a', zipfile.ZIP_DEFLATED) as archive:
+            members = set(archive.namelist())
+            for run_stamp, name, path in results_files:
+                member = '{}_{}.json'.format(self.app_name, run_stamp)
+                if member not in members:
+                    if name.endswith('.gz'):
+                        with gzip.open(path, 'rb') as source:
+                            archive.writestr(member, source.read())
+                    else:
+                        archive.write(path, member)
+                index[run_stamp] = archive_name
+        for run_stamp, name, path in results_files:
+            os.remove(path)
+        return len(results_files)
+
+    # Deletes the monthly archives past retention, measured from the end of their month, and their index entries
+    #
+    def archive_retention(self, index):
+        removed = 0
+        for name, path, mtime in self.scan(self.archive_dir, self.archive_pattern):
+            month = datetime.strptime(self.archive_pattern.match(name).group(1), '%Y%m')
+            month_end = datetime(month.year + month.month // 12, month.month % 12 + 1, 1).timestamp()
+            if self.age_days(month_end) > self.results_retention_days:
+                os.remove(path)
+                for run_stamp in [k for (k, v) in index.items() if v == name]:
+                    del index[run_stamp]
+                removed += 1
+        return removed
+
+    # Returns the results dictionary of an archived run, or None if the run is not in the archives
+    #
+    def archived_results(self, run_stamp):
+        archive_name = self.index_load().get(run_stamp)
+        if archive_name is None:
+            return None
+        with zipfile.ZipFile(os.path.join(self.archive_dir, archive_name), 'r') as archive:
+            return json.loads(archive.read('{}_{}.json'.format(self.app_name, run_stamp)).decode('utf-8'))
+
+    # Loads the archive index of run stamp => monthly archive name
+    #
+    def index_load(self):
+        if not os.path.isfile(self.index_file):
+            return {}
+        with open(self.index_file, 'r') as fp:
+            return json.load(fp)
+
+    # Writes the archive index through a temporary file
+    #
+    def index_write(self, index):
+        temp_file = self.index_file + '.tmp'
+        with open(temp_file, 'w') as fp:
+            json.dump(index, fp, indent=4, sort_keys=True)
+        os.replace(temp_file, self.index_file)
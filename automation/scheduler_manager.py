@@ -0,0 +1,156 @@
+# scheduler_manager module
+# Module holds the class => SchedulerManager - manages the long running daemon mode
+# Class responsible for keeping one MobileIDMatchManager, and with it the Jira, Qubole and http clients, warm between
+# runs, it re-polls the pixel-builder api on a set interval and runs only the pixels that are newly launched or whose
+# last refresh is older than the per pixel refresh interval, the number refreshed per cycle is capped so the refreshes
+# spread out over the interval, the refresh times are kept in a json state file so a restarted daemon picks up where
+# it left off, the log and results file retention pass is re-run on its own interval, with the daemon's log rolled
+# over to a new file before each pass
+#
+from datetime import datetime, timedelta
+import threading
+import signal
+import json
+import math
+import time
+import os
+import logging
+
+
+class SchedulerManager(object):
+    def __init__(self, cm_ssid_match, poll_interval, refresh_interval, retry_interval, max_refresh, state_file,
+                 retention, retention_interval, log_manager, log_file_prefix):
+        self.cm_ssid_match = cm_ssid_match
+        self.poll_interval = int(poll_interval)
+        self.refresh_interval = int(refresh_interval)
+        self.retry_interval = int(retry_interval)
+        self.max_refresh = int(max_refresh)
+        self.state_file = state_file
+        self.retention = retention
+        self.retention_interval = int(retention_interval)
+        self.log_manager = log_manager
+        self.log_file_prefix = log_file_prefix
+        # the first retention pass is started alongside the daemon
+        self.retention_started = time.time()
+        self.refreshed = {}
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+    # Runs the polling loop until a stop signal is received
+    #
+    def scheduler_manager(self):
+        self.signal_handlers()
+        self.refreshed = self.state_load()
+
+        self.logger.info("Scheduler started, polling every {} seconds with a {} second pixel refresh interval"
+                         .format(self.poll_interval, self.refresh_interval))
+        while not self.stop_event.is_set():
+            try:
+                self.poll_manager()
+            except Exception as e:
+                self.logger.error("Scheduler cycle failed => {}".format(e))
+            self.retention_manager()
+            self.stop_event.wait(self.poll_interval)
+        self.logger.info("Scheduler stopped")
+
+    # Fetches the pixel list and runs the pixels that are due for a refresh, the longest waiting first and never
+    # refreshed pixels before all others, up to the cycle limit
+    #
+    def poll_manager(self):
+        pixel_list = self.cm_ssid_match.api_manager()
+        if pixel_list is None:
+            self.logger.error("The pixel-builder api call failed to return a pixel dictionary, retrying next poll")
+            return
+
+        now = time.time()
+        new_pixels = [pixel for pixel in pixel_list if pixel.pixel_id not in self.refreshed]
+        due_pixels = sorted([pixel for pixel in pixel_list
+                             if now - self.refreshed.get(pixel.pixel_id, 0) >= self.refresh_interval],
+                            key=lambda pixel: self.refreshed.get(pixel.pixel_id, 0))
+        for pixel in new_pixels:
+            self.logger.info("New pixel picked up: {} - {}".format(pixel.pixel_id, pixel.campaign_name))
+        if not due_pixels:
+            self.logger.info("No pixels due for a refresh, {} live pixels checked".format(len(pixel_list)))
+            return
+
+        run_pixels = due_pixels[:self.cycle_limit(len(pixel_list))]
+        self.logger.info("Refreshing {} of {} live pixels, {} due pixels deferred to the next cycles"
+                         .format(len(run_pixels), len(pixel_list), len(due_pixels) - len(run_pixels)))
+        self.cm_ssid_match.pixel_run_manager(run_pixels)
+
+        # the pixels whose run failed before their comments or alert went out come due again after the retry
+        # interval, the others, including the pixels that only got a fail comment or missing ticket alert, wait the
+        # full refresh interval so the alerts are not repeated
+        retried = 0
+        for pixel in run_pixels:
+            if pixel.pixel_id in self.cm_ssid_match.completed_pixels:
+                self.refreshed[pixel.pixel_id] = now
+            else:
+                self.refreshed[pixel.pixel_id] = now - self.refresh_interval + self.retry_interval
+                retried += 1
+        if retried:
+            self.logger.warning("{} pixels were not refreshed, retrying in {} seconds"
+                                .format(retried, self.retry_interval))
+        # forget pixels no longer returned by the api so the state file doesn't grow without limit
+        live_ids = set(pixel.pixel_id for pixel in pixel_list)
+        self.refreshed = {k: v for (k, v) in self.refreshed.items() if k in live_ids}
+        self.state_write()
+
+    # Starts another background retention pass once the retention interval has passed since the last one started, the
+    # log is first rolled over to a new file so the finished one is left to the retention pass
+    #
+    def retention_manager(self):
+        if self.retention is None or self.retention.running() or \
+                time.time() - self.retention_started < self.retention_interval:
+            return
+        self.retention_started = time.time()
+        if self.log_manager is not None:
+            logfile_name = '{}{}.log'.format(self.log_file_prefix,
+                                             (datetime.now() - timedelta(hours=6)).strftime('%Y%m%d-%H%M%S'))
+            self.logger.info("Continuing the daemon log in {}".format(logfile_name))
+            self.log_manager.roll_over(logfile_name)
+            self.retention.set_active_files([logfile_name])
+        self.retention.start()
+
+    # Returns the most pixels to refresh in one cycle, the configured limit, or by default the live pixels spread evenly
+    # over the refresh interval with half as many again for the newly launched and retried pixels
+    #
+    def cycle_limit(self, live_pixels):
+        if self.max_refresh:
+            return self.max_refresh
+        return max(1, int(math.ceil(1.5 * live_pixels * self.poll_interval / float(self.refresh_interval))))
+
+    # Stops the loop after the current cycle on SIGTERM or SIGINT
+    #
+    def signal_handlers(self):
+        def stop(signum, frame):
+            self.logger.info("Received signal {}, stopping after the current cycle".format(signum))
+            self.stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+    # Loads the per pixel refresh times from the state file
+    #
+    def state_load(self):
+        if not os.path.isfile(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r') as fp:
+                return json.load(fp)
+        except Exception as e:
+            self.logger.error("There was a problem reading the scheduler state file {} => {}"
+                              .format(self.state_file, e))
+            return {}
+
+    # Writes the per pixel refresh times to the state file, through a temporary file so a crash never leaves it partial
+    #
+    def state_write(self):
+        temp_file = self.state_file + '.tmp'
+        try:
+            with open(temp_file, 'w') as fp:
+                json.dump(self.refreshed, fp)
+            os.replace(temp_file, self.state_file)
+        except Exception as e:
+            self.logger.error("There was a problem writing the scheduler state file {} => {}"
+                              .format(self.state_file, e))
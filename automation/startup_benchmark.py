@@ -0,0 +1,108 @@
+# startup_benchmark module
+# Development script that measures the startup cost of the automation - the time to start python and import the
+# modules, and to create the MobileIDMatchManager and finish a run where the pixel-builder api call fails or returns
+# no pixels (the alert emailer is stubbed out) - and confirms that the jira and qds_sdk packages are never imported on
+# such runs. Run with the packages of requirements.txt installed as: python startup_benchmark.py
+#
+# Measured on 2026-10-19 with requests 2.34.2, jira 3.10.5 and qds_sdk installed, Python 3.11.7, best of three:
+#   Process start and import:  0.216 s (python alone 0.020 s)
+#   Failed api run:            0.002 s best, 0.006 s worst
+#   No pixels run:             0.002 s best, 0.003 s worst
+#   Heavy modules loaded:      none
+# importing jira and qds_sdk.commands on the same host takes a further 0.43 s, which these runs no longer pay
+#
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import subprocess
+import threading
+import json
+import sys
+import time
+import logging
+
+heavy_modules = ['jira', 'qds_sdk']
+
+
+class NoPixelsHandler(BaseHTTPRequestHandler):
+
+    # Answers every request with an empty pixel-builder response
+    #
+    def do_GET(self):
+        body = json.dumps({'totalPixels': 0, 'pixels': []}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, log_format, *args):
+        pass
+
+
+# Returns the best time of a number of fresh python processes running the given code
+#
+def process_time(code, runs):
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# Returns the times of a number of runs of the process manager against the api url
+#
+def run_times(manager_class, config_params, api_url, runs):
+    config_params = dict(config_params, api_url=api_url)
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        manager = manager_class(config_params)
+        # no alert email is sent for the empty pixel list
+        manager.emailer = lambda pixel: None
+        manager.process_manager()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def benchmark(runs=5):
+    python_time = process_time('pass', runs)
+    import_time = process_time('import mobile_id_match_manager', runs)
+
+    from mobile_id_match_manager import MobileIDMatchManager
+
+    config_params = {
+        "jira_url": "https://jira.invalid", "jira_token": ("user", "token"), "jql_type": "''",
+        "jql_status": "(Open)", "qubole_token": "token", "cluster_label": "Hadoop2", "activity_prefilter": False,
+        "explain_queries": False, "partition_bytes": 0, "max_batch_bytes": 0, "query_pool_size": 0,
+        "api_url": "", "results_json_path": "", "results_json_name": "startup_benchmark",
+        "email_subject": "", "email_to": "", "email_from": "", "email_cc": "", "comment_mode": "full",
+        "count_threshold": 0, "rate_threshold": 0, "http_timeout": 5, "http_pool_connections": 1,
+        "http_pool_maxsize": 1, "http_rate": 100, "http_burst": 100, "http_retries": 0, "http_backoff": 1,
+        "work_queue_enabled": False, "work_queue_path": "", "work_queue_lease": 0, "work_queue_attempts": 0,
+        "worker_poll_interval": 0, "worker_idle_exit": 0
+    }
+
+    server = HTTPServer(('127.0.0.1', 0), NoPixelsHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    # the failed api call logs errors, keep them out of the benchmark output
+    logging.disable(logging.CRITICAL)
+    try:
+        # nothing listens on the discard port so the api call fails immediately
+        failed_times = run_times(MobileIDMatchManager, config_params, "http://127.0.0.1:9/", runs)
+        empty_times = run_times(MobileIDMatchManager, config_params,
+                                "http://127.0.0.1:{}/".format(server.server_port), runs)
+    finally:
+        server.shutdown()
+
+    print("Process start and import:  {:.3f} s (python alone {:.3f} s)".format(import_time, python_time))
+    print("Failed api run:            {:.3f} s best, {:.3f} s worst".format(min(failed_times), max(failed_times)))
+    print("No pixels run:             {:.3f} s best, {:.3f} s worst".format(min(empty_times), max(empty_times)))
+    loaded = [name for name in heavy_modules if name in sys.modules]
+    print("Heavy modules loaded:      {}".format(", ".join(loaded) if loaded else "none"))
+    return not loaded
+
+
+if __name__ == '__main__':
+    sys.exit(0 if benchmark() else 1)
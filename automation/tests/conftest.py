@@ -0,0 +1,24 @@
+# Test configuration, puts the automation modules on the import path and provides a configuration dictionary with
+# every setting main.py reads from config.ini
+#
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def config_params(tmp_path):
+    return {
+        "jira_url": "https://jira.invalid", "jira_token": ("user", "token"), "jql_type": "''",
+        "jql_status": "(Open)", "qubole_token": "token", "cluster_label": "Hadoop2", "activity_prefilter": False,
+        "explain_queries": False, "partition_bytes": 0, "max_batch_bytes": 0, "query_pool_size": 0,
+        "api_url": "http://127.0.0.1:9/", "results_json_path": str(tmp_path) + os.sep,
+        "results_json_name": "mobile_device_id_match", "email_subject": "", "email_to": "", "email_from": "",
+        "email_cc": "", "http_timeout": 5, "http_pool_connections": 1, "http_pool_maxsize": 1, "http_rate": 5,
+        "http_burst": 5, "http_retries": 0, "http_backoff": 1, "comment_mode": "delta", "count_threshold": 0.02,
+        "rate_threshold": 0.01, "work_queue_enabled": False, "work_queue_path": "", "work_queue_lease": 60,
+        "work_queue_attempts": 3, "worker_poll_interval": 1, "worker_idle_exit": 1
+    }
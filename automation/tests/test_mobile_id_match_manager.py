@@ -0,0 +1,76 @@
+import json
+
+from mobile_id_match_manager import MobileIDMatchManager
+from pixel_records import PixelRecord, MatchResult
+
+
+def manager_with_posted(config_params, posted):
+    manager = MobileIDMatchManager(config_params)
+    manager.previous_results = {'101': {'run_id': 'run0', 'end_date': '20990101', 'results': posted.to_dict(),
+                                        'posted': posted.to_dict()}}
+    return manager
+
+
+def test_results_delta_without_posted_results(config_params):
+    manager = MobileIDMatchManager(config_params)
+    assert manager.results_delta(MatchResult('101', 100, 50, 10, 5, 200, 20)) is None
+
+
+def test_results_delta_full_mode(config_params):
+    config_params['comment_mode'] = 'full'
+    manager = manager_with_posted(config_params, MatchResult('101', 100, 50, 10, 5, 200, 20))
+    assert manager.results_delta(MatchResult('101', 200, 50, 10, 5, 200, 20)) is None
+
+
+def test_results_delta_count_threshold(config_params):
+    manager = manager_with_posted(config_params, MatchResult('101', 100, 50, 10, 5, 200, 20))
+    assert not manager.results_delta(MatchResult('101', 102, 51, 10, 5, 200, 20))['changed']
+    delta = manager.results_delta(MatchResult('101', 103, 51, 10, 5, 200, 20))
+    assert delta['changed']
+    assert delta['hashed_chpck'] == (100, 103, 3)
+
+
+def test_results_delta_rate_threshold(config_params):
+    config_params['count_threshold'] = 1.0
+    manager = manager_with_posted(config_params, MatchResult('101', 1000, 500, 0, 0, 1000, 500))
+    # the hashes rate moves from 0.5 to 0.505, the cookies rate from 0.5 to 0.52
+    assert not manager.results_delta(MatchResult('101', 1000, 505, 0, 0, 1000, 500))['changed']
+    delta = manager.results_delta(MatchResult('101', 1000, 500, 0, 0, 1000, 520))
+    assert delta['changed']
+    assert delta['match_rate_cookies'] == (0.5, 0.52, 0.02)
+
+
+def test_results_delta_rate_to_none(config_params):
+    manager = manager_with_posted(config_params, MatchResult('101', 100, 50, 0, 0, 200, 20))
+    delta = manager.results_delta(MatchResult('101', 100, 50, 0, 0, 0, 0))
+    assert delta['changed']
+    assert delta['match_rate_cookies'] == (0.1, 'None', 'None')
+
+
+def test_skipped_pixel_keeps_posted_baseline(config_params):
+    manager = manager_with_posted(config_params, MatchResult('101', 100, 50, 10, 5, 200, 20))
+    pixel = PixelRecord('101', 'Campaign', '20260101', '20990101')
+    for count in (101, 102):
+        match_result = MatchResult('101', count, 50, 10, 5, 200, 20)
+        assert not manager.results_delta(match_result)['changed']
+        manager.latest_entry(pixel, match_result, manager.previous_results['101']['posted'])
+        manager.previous_results = manager.latest_dict
+        manager.latest_dict = {}
+    # a slow drift adds up against the posted baseline
+    assert manager.results_delta(MatchResult('101', 103, 50, 10, 5, 200, 20))['changed']
+
+
+def test_latest_file_write_merges_and_drops_ended_campaigns(config_params):
+    manager = MobileIDMatchManager(config_params)
+    with open(manager.latest_file_name, 'w') as fp:
+        json.dump({'1': {'run_id': 'run0', 'end_date': '20990101', 'results': {}, 'posted': {}},
+                   '2': {'run_id': 'run0', 'end_date': '20000101', 'results': {}, 'posted': {}}}, fp)
+    match_result = MatchResult('3', 100, 50, 10, 5, 200, 20)
+    manager.latest_entry(PixelRecord('3', 'Campaign', '20260101', '20990101'), match_result, match_result.to_dict())
+
+    manager.latest_file_write()
+
+    latest_results = manager.latest_results_load()
+    assert sorted(latest_results) == ['1', '3']
+    assert latest_results['3']['posted'] == match_result.to_dict()
+    assert latest_results['3']['run_id'] == manager.run_id
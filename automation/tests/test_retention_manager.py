@@ -0,0 +1,128 @@
+from datetime import datetime
+import zipfile
+import gzip
+import json
+import os
+
+import pytest
+
+from retention_manager import RetentionManager
+
+app_name = 'mobile_device_id_match'
+day = 86400.0
+now = datetime(2026, 10, 19, 12).timestamp()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    log_dir = tmp_path / 'logs'
+    results_dir = tmp_path / 'results'
+    log_dir.mkdir()
+    results_dir.mkdir()
+    return log_dir, results_dir
+
+
+def retention_manager(dirs, active_files=()):
+    log_dir, results_dir = dirs
+    manager = RetentionManager(app_name, str(log_dir), 7, 180, str(results_dir), 30, 90, 730, active_files)
+    manager.now = now
+    return manager
+
+
+def aged_file(directory, name, age_days, content='{}'):
+    path = directory / name
+    if name.endswith('.gz'):
+        with gzip.open(str(path), 'wt') as fp:
+            fp.write(content)
+    else:
+        path.write_text(content)
+    mtime = now - age_days * day
+    os.utime(str(path), (mtime, mtime))
+    return path
+
+
+def results_name(run_stamp):
+    return '{}_{}.json'.format(app_name, run_stamp)
+
+
+def test_log_files_compressed_and_removed_at_the_age_boundaries(dirs):
+    log_dir = dirs[0]
+    aged_file(log_dir, app_name + '_new.log', 7)
+    aged_file(log_dir, app_name + '_old.log', 7.01, 'log line')
+    aged_file(log_dir, app_name + '_kept.log.gz', 180)
+    aged_file(log_dir, app_name + '_expired.log.gz', 180.01)
+    aged_file(log_dir, 'other_app_old.log', 365)
+    retention_manager(dirs).log_retention()
+
+    assert sorted(os.listdir(str(log_dir))) == [app_name + '_kept.log.gz', app_name + '_new.log',
+                                                app_name + '_old.log.gz', 'other_app_old.log']
+    with gzip.open(str(log_dir / (app_name + '_old.log.gz')), 'rt') as fp:
+        assert fp.read() == 'log line'
+    # the compressed file keeps its age
+    assert os.path.getmtime(str(log_dir / (app_name + '_old.log.gz'))) == pytest.approx(now - 7.01 * day)
+
+
+def test_active_files_are_never_touched(dirs):
+    log_dir = dirs[0]
+    active = aged_file(log_dir, app_name + '_active.log', 365)
+    manager = retention_manager(dirs, [str(active)])
+    manager.log_retention()
+    assert os.listdir(str(log_dir)) == [app_name + '_active.log']
+
+    manager.set_active_files([])
+    manager.log_retention()
+    assert os.listdir(str(log_dir)) == []
+
+
+def test_results_files_compressed_and_archived_at_the_age_boundaries(dirs):
+    results_dir = dirs[1]
+    aged_file(results_dir, results_name('20260919-060000'), 30)
+    aged_file(results_dir, results_name('20260901-060000'), 30.01)
+    aged_file(results_dir, results_name('20260721-060000'), 90)
+    aged_file(results_dir, results_name('20260701-060000'), 90.01, '{"1": {"total_hhid": 5}}')
+    aged_file(results_dir, results_name('20260601-060000') + '.gz', 120, '{"2": {"total_hhid": 7}}')
+    manager = retention_manager(dirs)
+    manager.results_retention()
+
+    assert sorted(os.listdir(str(results_dir))) == ['archive', results_name('20260721-060000') + '.gz',
+                                                    results_name('20260901-060000') + '.gz',
+                                                    results_name('20260919-060000')]
+    archive_dir = results_dir / 'archive'
+    assert sorted(os.listdir(str(archive_dir))) == [app_name + '_202606.zip', app_name + '_202607.zip',
+                                                    app_name + '_index.json']
+    with zipfile.ZipFile(str(archive_dir / (app_name + '_202607.zip'))) as archive:
+        assert archive.infolist()[0].compress_type == zipfile.ZIP_DEFLATED
+    with open(str(archive_dir / (app_name + '_index.json'))) as fp:
+        assert json.load(fp) == {'20260601-060000': app_name + '_202606.zip',
+                                 '20260701-060000': app_name + '_202607.zip'}
+    # gzipped results files are stored in the archive as plain json
+    assert manager.archived_results('20260601-060000') == {'2': {'total_hhid': 7}}
+
+
+def test_archived_results_lookup(dirs):
+    results_dir = dirs[1]
+    aged_file(results_dir, results_name('20260701-060000'), 100, '{"1": {"total_hhid": 5}}')
+    manager = retention_manager(dirs)
+    manager.results_retention()
+
+    assert manager.archived_results('20260701-060000') == {'1': {'total_hhid': 5}}
+    assert manager.archived_results('20260702-060000') is None
+
+
+def test_monthly_archives_removed_after_retention(dirs):
+    results_dir = dirs[1]
+    aged_file(results_dir, results_name('20240901-060000'), 800)
+    aged_file(results_dir, results_name('20241001-060000'), 800)
+    manager = retention_manager(dirs)
+    manager.now = datetime(2024, 10, 1).timestamp() + 730 * day
+    manager.results_retention()
+    archive_dir = results_dir / 'archive'
+    assert sorted(os.listdir(str(archive_dir))) == [app_name + '_202409.zip', app_name + '_202410.zip',
+                                                    app_name + '_index.json']
+
+    # the September archive is aged from the end of its month, just past retention a second later
+    manager.now += 1
+    manager.results_retention()
+    assert sorted(os.listdir(str(archive_dir))) == [app_name + '_202410.zip', app_name + '_index.json']
+    assert manager.archived_results('20240901-060000') is None
+    assert manager.archived_results('20241001-060000') == {}
@@ -0,0 +1,106 @@
+import pytest
+
+import work_queue_manager
+from work_queue_manager import WorkQueueManager
+from pixel_records import PixelRecord, WorkItem
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue_manager, 'time', clock)
+    return clock
+
+
+def work_items(count):
+    return [WorkItem('CAM-{}'.format(i), PixelRecord(str(i), 'Campaign', '20260101', '20990101'))
+            for i in range(count)]
+
+
+def entry(pixel_id):
+    return {'run_id': 'run1', 'end_date': '20990101', 'results': {'total_hhid': int(pixel_id)}, 'posted': {}}
+
+
+def test_empty_path_is_a_config_error():
+    with pytest.raises(ValueError):
+        WorkQueueManager('', 60, 3)
+
+
+def test_claim_returns_the_work_item(tmp_path, clock):
+    queue = WorkQueueManager(str(tmp_path / 'queue.db'), 60, 3)
+    queue.enqueue('run1', 'results.json', work_items(1))
+    item_id, run_id, results_file_name, ticket = queue.claim('w1')
+    assert (run_id, results_file_name) == ('run1', 'results.json')
+    assert ticket == work_items(1)[0]
+    assert queue.claim('w2') is None
+
+
+def test_expired_lease_is_requeued(tmp_path, clock):
+    queue = WorkQueueManager(str(tmp_path / 'queue.db'), 60, 3)
+    queue.enqueue('run1', 'results.json', work_items(1))
+    item_id = queue.claim('w1')[0]
+
+    clock.now += 30
+    assert queue.claim('w2') is None
+    clock.now += 31
+    assert queue.claim('w2')[0] == item_id
+    # the first worker lost its lease, its late result is discarded
+    assert not queue.renew(item_id, 'w1')
+    queue.complete(item_id, 'w1', entry('0'))
+    assert queue.finalize_run('run1') is None
+
+
+def test_renewed_lease_is_kept(tmp_path, clock):
+    queue = WorkQueueManager(str(tmp_path / 'queue.db'), 60, 3)
+    queue.enqueue('run1', 'results.json', work_items(1))
+    item_id = queue.claim('w1')[0]
+    clock.now += 50
+    assert queue.renew(item_id, 'w1')
+    clock.now += 50
+    assert queue.claim('w2') is None
+
+
+def test_release_retries_until_attempts_are_used(tmp_path, clock):
+    queue = WorkQueueManager(str(tmp_path / 'queue.db'), 60, 2)
+    queue.enqueue('run1', 'results.json', work_items(1))
+    item_id = queue.claim('w1')[0]
+    queue.release(item_id, 'w1')
+    assert queue.claim('w1')[0] == item_id
+    queue.release(item_id, 'w1')
+    assert queue.claim('w1') is None
+    assert queue.finished_runs() == [('run1', 'results.json')]
+
+
+def test_run_with_failed_last_item_is_finalized_once(tmp_path, clock):
+    queue = WorkQueueManager(str(tmp_path / 'queue.db'), 60, 1)
+    queue.enqueue('run1', 'results.json', work_items(2))
+    first = queue.claim('w1')
+    queue.claim('w2')
+    queue.complete(first[0], 'w1', entry('0'))
+    assert queue.finalize_run('run1') is None
+    assert queue.finished_runs() == []
+
+    # the second worker dies, its item fails when the lease expires during another claim
+    clock.now += 61
+    assert queue.claim('w3') is None
+    assert queue.finished_runs() == [('run1', 'results.json')]
+    assert queue.finalize_run('run1') == {'0': entry('0')}
+    assert queue.finalize_run('run1') is None
+    assert queue.finished_runs() == []
+
+
+def test_results_without_match_results_are_left_out(tmp_path, clock):
+    queue = WorkQueueManager(str(tmp_path / 'queue.db'), 60, 3)
+    queue.enqueue('run1', 'results.json', work_items(2))
+    for pixel_id in ('0', '1'):
+        item_id = queue.claim('w1')[0]
+        queue.complete(item_id, 'w1', entry(pixel_id) if pixel_id == '1' else None)
+    assert queue.finalize_run('run1') == {'1': entry('1')}
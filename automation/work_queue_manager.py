@@ -0,0 +1,181 @@
+# work_queue_manager module
+# Module holds the class => WorkQueueManager - manages the shared pixel work queue
+# Class responsible for distributing the pixel/ticket work items of a run between worker processes on any number of
+# hosts, the queue is a SQLite database (on the shared zfs1 mount, or a local path as a stand-in) where workers claim
+# items under a time limited lease, expired leases are returned to the queue, results are written back per item and
+# the run's results are collected once when its last item finishes
+#
+import sqlite3
+import json
+import time
+import logging
+
+from pixel_records import WorkItem
+
+
+class WorkQueueManager(object):
+    def __init__(self, db_path, lease_seconds, max_attempts):
+        # sqlite opens a new private temporary database for an empty path, so every connection would see its own
+        # empty queue
+        if not db_path:
+            raise ValueError("The [WorkQueue] path must be set to the shared queue database when the work queue is "
+                             "enabled or workers are run")
+        self.db_path = db_path
+        self.lease_seconds = int(lease_seconds)
+        self.max_attempts = int(max_attempts)
+        self.logger = logging.getLogger(__name__)
+        self.create_tables()
+
+    # Opens a connection in autocommit mode, transactions are started explicitly, one connection per call so the
+    # manager can be shared by threads
+    #
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+
+    # Creates the queue tables if they don't exist yet
+    #
+    def create_tables(self):
+        conn = self.connect()
+        try:
+            conn.execute("""create table if not exists runs (
+                            run_id text primary key,
+                            results_file_name text not null,
+                            finalized integer not null default 0)""")
+            conn.execute("""create table if not exists work_items (
+                            item_id integer primary key autoincrement,
+                            run_id text not null,
+                            ticket text not null,
+                            status text not null default 'pending',
+                            lease_owner text,
+                            lease_expires real,
+                            attempts integer not null default 0,
+                            result text)""")
+            conn.execute("create index if not exists work_items_status on work_items (status, lease_expires)")
+            conn.execute("create index if not exists work_items_run on work_items (run_id, status)")
+        finally:
+            conn.close()
+
+    # Adds the run and one work item per ticket, the work items are stored as json
+    #
+    def enqueue(self, run_id, results_file_name, tickets):
+        conn = self.connect()
+        try:
+            conn.execute("begin immediate")
+            conn.execute("insert or ignore into runs (run_id, results_file_name) values (?, ?)",
+                         (run_id, results_file_name))
+            conn.executemany("insert into work_items (run_id, ticket) values (?, ?)",
+                             [(run_id, json.dumps(ticket.to_json())) for ticket in tickets])
+            conn.execute("commit")
+        finally:
+            conn.close()
+        self.logger.info("Enqueued {} work items for run {}".format(len(tickets), run_id))
+
+    # Returns expired leases to the queue, or marks the item failed once it has used up its attempts
+    #
+    def requeue_expired(self, conn):
+        now = time.time()
+        failed = conn.execute("update work_items set status = 'failed', lease_owner = null "
+                              "where status = 'leased' and lease_expires < ? and attempts >= ?",
+                              (now, self.max_attempts)).rowcount
+        requeued = conn.execute("update work_items set status = 'pending', lease_owner = null "
+                                "where status = 'leased' and lease_expires < ?", (now,)).rowcount
+        if requeued or failed:
+            self.logger.warning("Expired work item leases: {} re-queued, {} failed after {} attempts"
+                                .format(requeued, failed, self.max_attempts))
+
+    # Claims the oldest pending work item under a lease, returns (item_id, run_id, results_file_name, ticket) or
+    # None when the queue is empty
+    #
+    def claim(self, worker_id):
+        conn = self.connect()
+        try:
+            conn.execute("begin immediate")
+            self.requeue_expired(conn)
+            row = conn.execute("select w.item_id, w.run_id, r.results_file_name, w.ticket "
+                               "from work_items w join runs r on r.run_id = w.run_id "
+                               "where w.status = 'pending' order by w.item_id limit 1").fetchone()
+            if row is not None:
+                conn.execute("update work_items set status = 'leased', lease_owner = ?, lease_expires = ?, "
+                             "attempts = attempts + 1 where item_id = ?",
+                             (worker_id, time.time() + self.lease_seconds, row[0]))
+            conn.execute("commit")
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+        return row[0], row[1], row[2], WorkItem.from_json(json.loads(row[3]))
+
+    # Extends the lease of an item still being worked on, returns False if the lease was lost
+    #
+    def renew(self, item_id, worker_id):
+        conn = self.connect()
+        try:
+            renewed = conn.execute("update work_items set lease_expires = ? "
+                                   "where item_id = ? and lease_owner = ? and status = 'leased'",
+                                   (time.time() + self.lease_seconds, item_id, worker_id)).rowcount
+        finally:
+            conn.close()
+        return renewed == 1
+
+    # Writes the item result back and marks it done, the result is None for pixels without match results
+    #
+    def complete(self, item_id, worker_id, result):
+        conn = self.connect()
+        try:
+            done = conn.execute("update work_items set status = 'done', result = ?, lease_owner = null "
+                                "where item_id = ? and lease_owner = ? and status = 'leased'",
+                                (json.dumps(result), item_id, worker_id)).rowcount
+        finally:
+            conn.close()
+        if done != 1:
+            self.logger.warning("Work item {} lease was lost before completion, result discarded".format(item_id))
+
+    # Returns a failed item to the queue for another attempt, or marks it failed once it has used up its attempts
+    #
+    def release(self, item_id, worker_id):
+        conn = self.connect()
+        try:
+            conn.execute("update work_items set status = case when attempts >= ? then 'failed' else 'pending' end, "
+                         "lease_owner = null where item_id = ? and lease_owner = ? and status = 'leased'",
+                         (self.max_attempts, item_id, worker_id))
+        finally:
+            conn.close()
+
+    # Returns (run_id, results_file_name) for the runs not yet collected that have no pending or leased items left,
+    # this includes runs whose last item was marked failed when its lease expired during another worker's claim
+    #
+    def finished_runs(self):
+        conn = self.connect()
+        try:
+            return conn.execute("select r.run_id, r.results_file_name from runs r where r.finalized = 0 "
+                                "and not exists (select 1 from work_items w where w.run_id = r.run_id "
+                                "and w.status in ('pending', 'leased')) order by r.run_id").fetchall()
+        finally:
+            conn.close()
+
+    # Collects the run's results, once, after its last item finishes, returns a dictionary of pixel id => latest entry
+    # or None if the run is still in progress or was already collected
+    #
+    def finalize_run(self, run_id):
+        conn = self.connect()
+        try:
+            conn.execute("begin immediate")
+            open_items = conn.execute("select count(*) from work_items where run_id = ? "
+                                      "and status in ('pending', 'leased')", (run_id,)).fetchone()[0]
+            finalized = conn.execute("select finalized from runs where run_id = ?", (run_id,)).fetchone()[0]
+            if open_items or finalized:
+                conn.execute("commit")
+                return None
+
+            results = {}
+            for ticket, result in conn.execute("select ticket, result from work_items "
+                                               "where run_id = ? and status = 'done'", (run_id,)):
+                result = json.loads(result)
+                if result is not None:
+                    results[WorkItem.from_json(json.loads(ticket)).pixel.pixel_id] = result
+            conn.execute("update runs set finalized = 1 where run_id = ?", (run_id,))
+            conn.execute("commit")
+        finally:
+            conn.close()
+        return results